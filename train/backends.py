@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from coverage_grid import TACTICS, TOPICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEMINI_MODEL = "gemini-1.5-flash"
+
+
+class GeneratorBackend:
+    """
+    Interface the generation engine talks to.
+
+    Backends expose `model_name` (part of the response cache key) and
+    `generate_content_async(prompt, generation_config=...)` returning an
+    object with `.text` and, where available, `.usage_metadata` and
+    `.candidates[*].finish_reason` like a Gemini response.
+    """
+
+    model_name = "backend"
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None):
+        return await asyncio.to_thread(self.generate_content, prompt, generation_config=generation_config)
+
+
+class GeminiBackend(GeneratorBackend):
+    """Google Gemini via `google.generativeai`, configured on first use rather than at import."""
+
+    def __init__(self, model_name: str = DEFAULT_GEMINI_MODEL, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=self._api_key or os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt, generation_config=None):
+        return self._get_model().generate_content(prompt, generation_config=generation_config)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        return await self._get_model().generate_content_async(prompt, generation_config=generation_config)
+
+
+# Subjects the offline templates talk about, per topic
+_SUBJECTS = {
+    "Personal finance": ["index funds", "budgeting apps", "credit cards", "emergency savings"],
+    "Career development": ["networking", "side projects", "performance reviews", "job hopping"],
+    "Relationships": ["texting habits", "date nights", "arguing fairly", "long-distance calls"],
+    "Health & wellness": ["morning stretches", "intermittent fasting", "sleep schedules", "daily walks"],
+    "Technology trends": ["AI assistants", "smart glasses", "open-source models", "edge computing"],
+    "Education": ["flashcards", "online courses", "homework policies", "study groups"],
+    "Environmental issues": ["recycling rules", "heat pumps", "tree planting", "reusable bags"],
+    "Politics": ["local elections", "ballot measures", "town hall meetings", "campaign ads"],
+    "Local community": ["farmers markets", "library events", "neighborhood cleanups", "bike lanes"],
+    "Mental health": ["journaling", "therapy apps", "screen time limits", "breathing exercises"],
+    "Parenting": ["bedtime routines", "screen rules for kids", "school lunches", "chore charts"],
+    "Consumer technology": ["phone cases", "wireless earbuds", "laptop chargers", "smart speakers"],
+}
+
+# One or more bait templates per tactic, in `TACTICS` order
+_BAIT_TEMPLATES = [
+    ["Everything you were taught about {subject} is wrong", "You've been doing {subject} wrong your whole life"],
+    ["The {subject} secret successful people never talk about", "What nobody tells you about {subject}"],
+    ["Why everyone around you quietly stopped bothering with {subject}", "Your neighbors already gave up on {subject}"],
+    ["{Subject} is quietly ruining your life right now", "Stop {subject} today before it's too late"],
+    ["The dark truth about {subject} no one wants to admit", "{Subject} is far worse than you think"],
+    ["Experts have been hiding the truth about {subject} for decades", "What the so-called experts won't say about {subject}"],
+    ["Everyone is switching to {subject} and you're missing out", "The {subject} trend you'll regret ignoring"],
+    ["Why ignoring {subject} actually makes you smarter", "Unpopular opinion: {subject} is overrated"],
+    ["The simple {subject} trick that put me ahead of everyone I know", "How {subject} made me twice as successful as my friends"],
+    ["What insiders actually do about {subject}", "The {subject} playbook top executives keep to themselves"],
+]
+
+_GENUINE_TEMPLATES = [
+    "I've been trying {subject} for a few months and it has helped a bit, though it took some adjusting",
+    "Sharing what worked for me with {subject}; your situation may well be different",
+    "A short write-up of what I learned about {subject} this year, including the parts that didn't work",
+    "Some notes on {subject} from our local group, with a couple of sources worth reading",
+]
+
+
+class OfflineBackend(GeneratorBackend):
+    """
+    Template-based stand-in for the LLM that never touches the network.
+
+    Reads the requested count and any pinned topic/tactic cells from the
+    prompt, fills bait and genuine templates for them and returns a JSON
+    array shaped like the model's output. Output is cut at roughly
+    `max_output_tokens` (4 characters per token) so truncation handling is
+    exercised, and `latency` simulates a round trip so the engine's
+    concurrency and throughput can be benchmarked offline. Responses are
+    deterministic per (seed, prompt, call number).
+    """
+
+    model_name = "offline-templates"
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.seed = seed
+        self._calls = 0
+
+    def _rng(self, prompt: str) -> random.Random:
+        self._calls += 1
+        digest = hashlib.sha256(f"{self.seed}:{self._calls}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _example(self, rng: random.Random, topic: str, tactic: int) -> Dict[str, Any]:
+        subject = rng.choice(_SUBJECTS[topic])
+        bait = rng.choice(_BAIT_TEMPLATES[tactic - 1]).format(subject=subject, Subject=subject[:1].upper() + subject[1:])
+        genuine = rng.choice(_GENUINE_TEMPLATES).format(subject=subject)
+        return {"engagement_bait": bait, "genuine_content": genuine, "topic": topic, "tactic": tactic}
+
+    def generate_content(self, prompt, generation_config=None):
+        rng = self._rng(prompt)
+        match = re.search(r"exactly (\d+) examples", prompt)
+        num = int(match.group(1)) if match else 10
+        cells = [(topic, int(tactic)) for topic, tactic in re.findall(r"Topic: (.+?); tactic (\d+)", prompt)]
+        while len(cells) < num:
+            cells.append((rng.choice(TOPICS), rng.randint(1, len(TACTICS))))
+        examples: List[Dict[str, Any]] = [self._example(rng, topic, tactic) for topic, tactic in cells[:num]]
+
+        text = json.dumps(examples, indent=2)
+        max_tokens = (generation_config or {}).get("max_output_tokens")
+        finish_reason = "STOP"
+        if max_tokens and len(text) > max_tokens * 4:
+            text = text[:max_tokens * 4]
+            finish_reason = "MAX_TOKENS"
+        output_tokens = len(text) // 4 + 1
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                candidates_token_count=output_tokens,
+                total_token_count=output_tokens + len(prompt) // 4 + 1,
+            ),
+            candidates=[SimpleNamespace(finish_reason=finish_reason)],
+        )
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.generate_content(prompt, generation_config=generation_config)
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "offline": OfflineBackend,
+}
+
+
+def get_backend(name: str = "gemini", **kwargs) -> GeneratorBackend:
+    """Construct a backend by name; nothing is initialized until the first request."""
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
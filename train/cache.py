@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".generation_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(model_name: str, prompt: str, generation_config: Dict[str, Any], seed: Optional[int]) -> str:
+    """Content address of a model call: hash of model, prompt, config and seed."""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config, "seed": seed},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def plan_key(model_name: str, seed: int, batching: Any) -> str:
+    """Address of the request plan recorded for the request with `seed` under a batching mode."""
+    payload = json.dumps({"model": model_name, "plan_for_seed": seed, "batching": batching}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of model responses with size-based LRU eviction.
+
+    Entries live under `cache_dir/<key[:2]>/<key>.json`. File mtimes double as
+    the LRU clock: hits touch the entry, and once the cache grows past
+    `max_bytes` the least recently used entries are removed.
+
+    Besides responses, the cache records the plan (examples requested,
+    `max_output_tokens`, target cells) chosen for each request, so a rerun
+    with the same seed builds the same prompts and hits the cached
+    responses instead of re-deciding sizes from a different history.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes: Dict[str, int] = {}
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    self._sizes[path] = os.path.getsize(path)
+        self._total_bytes = sum(self._sizes.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)
+        return entry
+
+    def _write(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        self._total_bytes += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def get(self, key: str):
+        """
+        Return the cached response for `key`, or None.
+
+        The response has `.text`, `.usage_metadata` and `.candidates` with the
+        finish reason, like the live one, so adaptive batching sees the same
+        output token counts and truncation on replay.
+        """
+        entry = self._read(key)
+        if entry is None or "text" not in entry:
+            self.misses += 1
+            return None
+        self.hits += 1
+        finish_reason = entry.get("finish_reason")
+        return SimpleNamespace(
+            text=entry["text"],
+            usage_metadata=SimpleNamespace(
+                total_token_count=entry.get("total_tokens"),
+                candidates_token_count=entry.get("output_tokens"),
+            ),
+            candidates=[SimpleNamespace(finish_reason=finish_reason)] if finish_reason else [],
+        )
+
+    def put(
+        self,
+        key: str,
+        text: str,
+        total_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        finish_reason: Optional[str] = None
+    ):
+        self._write(key, {
+            "text": text,
+            "total_tokens": total_tokens,
+            "output_tokens": output_tokens,
+            "finish_reason": finish_reason,
+        })
+
+    def get_plan(self, key: str) -> Optional[Dict[str, Any]]:
+        """The plan recorded under `key` (see `plan_key`), or None."""
+        entry = self._read(key)
+        return entry.get("plan") if entry is not None else None
+
+    def put_plan(self, key: str, plan: Dict[str, Any]):
+        self._write(key, {"plan": plan})
+
+    def _evict(self):
+        # Evict down to 90% of the budget so eviction scans stay infrequent
+        low_water = self.max_bytes * 0.9
+        by_age = sorted(self._sizes, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in by_age:
+            if self._total_bytes <= low_water:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= self._sizes.pop(path)
+            self.evictions += 1
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        logger.info(
+            f"Response cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), "
+            f"{self.evictions} evictions, {self._total_bytes / 1e6:.1f} MB on disk"
+        )
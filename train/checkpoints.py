@@ -0,0 +1,248 @@
+import dataclasses
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from safetensors.torch import load_file, save_file
+from transformers import Trainer, TrainerCallback
+from transformers.trainer import OPTIMIZER_NAME, SCHEDULER_NAME, TRAINER_STATE_NAME
+from transformers.trainer_callback import ExportableState
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "model.safetensors"
+META_FILE = "checkpoint.json"
+RNG_STATE_FILE = "rng_state.pth"
+
+
+def _is_main_process() -> bool:
+    return int(os.environ.get("RANK", 0)) == 0
+
+
+def _to_cpu(obj: Any) -> Any:
+    """Copy of a nested state dict with every tensor cloned to CPU, safe to write from another thread."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+
+class CheckpointManager(TrainerCallback):
+    """
+    Writes training checkpoints from a background thread and keeps the top-k.
+
+    `save` only snapshots the weights to CPU memory on the training thread;
+    the safetensors file, config and metadata are written by a single writer
+    thread while training continues. At most one write is in flight, so a
+    slow disk shows up as blocked time instead of piling up snapshots.
+    Checkpoints are ranked by `metric` from the evaluation that preceded the
+    save and only the best `keep` survive, plus the most recent one so
+    there is always a checkpoint to resume from; at the end of training the
+    best one is loaded back into the model. Alongside the weights, the
+    files `extra_files` returns at save time (optimizer, scheduler, RNG and
+    trainer state from `CheckpointingTrainer`) are written on the same
+    thread, so `Trainer.train(resume_from_checkpoint=...)` works on them.
+    Every process tracks the ranking, only the main process writes.
+    """
+
+    def __init__(self, output_dir: str, metric: str = "f1", greater_is_better: bool = True, keep: int = 2):
+        self.output_dir = output_dir
+        self.metric = metric if metric.startswith("eval_") else f"eval_{metric}"
+        self.greater_is_better = greater_is_better
+        self.keep = max(1, keep)
+        self.checkpoints: List[Tuple[float, int, str]] = []  # (score, step, path)
+        self._on_disk: List[str] = []  # checkpoints written or queued, oldest first
+        self._last_score: Optional[float] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending: Optional[Future] = None
+        self.best_loaded = False
+        self.saves = 0
+        self.bytes_written = 0
+        self.blocked_seconds = 0.0
+        self.write_seconds = 0.0
+
+    @property
+    def best_checkpoint(self) -> Optional[str]:
+        return self.checkpoints[0][2] if self.checkpoints else None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if state.global_step > 0:
+            self._restore_ranking(state.global_step)
+
+    def _restore_ranking(self, global_step: int):
+        """Rebuild the ranking from the checkpoints on disk when training resumes."""
+        found = []
+        for name in os.listdir(self.output_dir) if os.path.isdir(self.output_dir) else []:
+            meta_path = os.path.join(self.output_dir, name, META_FILE)
+            if not re.fullmatch(r"checkpoint-\d+", name) or not os.path.exists(meta_path):
+                continue
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["step"] <= global_step and self.metric in meta:
+                found.append((meta[self.metric], meta["step"], os.path.join(self.output_dir, name)))
+        found.sort(key=lambda c: (-c[0] if self.greater_is_better else c[0], c[1]))
+        self.checkpoints = found[:self.keep]
+        self._on_disk = [c[2] for c in sorted(found, key=lambda c: c[1])]
+        logger.info(f"Resuming at step {global_step} with {len(self.checkpoints)} ranked checkpoints")
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if metrics and self.metric in metrics:
+            self._last_score = metrics[self.metric]
+
+    def save(self, model: torch.nn.Module, step: int, extra_files: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        Snapshot `model` (and `extra_files()`: file name -> text or object
+        for `torch.save`) and queue the write; returns once training can continue.
+        """
+        start = time.perf_counter()
+        if self._last_score is None:
+            logger.warning(f"No {self.metric} from a preceding evaluation, skipping checkpoint at step {step}")
+            return
+        score, self._last_score = self._last_score, None
+        path = os.path.join(self.output_dir, f"checkpoint-{step}")
+
+        self.checkpoints.append((score, step, path))
+        # Best first; among equal scores the earlier checkpoint wins
+        self.checkpoints.sort(key=lambda c: (-c[0] if self.greater_is_better else c[0], c[1]))
+        self.checkpoints = self.checkpoints[:self.keep]
+        # The newest checkpoint is written and kept even when it ranks below
+        # the top-k, so training can resume from it; the previous newest and
+        # anything that dropped out of the ranking go
+        ranked = {c[2] for c in self.checkpoints}
+        evicted = [p for p in self._on_disk if p not in ranked and p != path]
+        self._on_disk = [p for p in self._on_disk if p not in evicted and p != path] + [path]
+
+        if _is_main_process():
+            self.wait()
+            state = {k: v.detach().to("cpu", copy=True).contiguous() for k, v in model.state_dict().items()}
+            files = extra_files() if extra_files is not None else {}
+            self._pending = self._executor.submit(
+                self._write, path, state, model.config, {"step": step, self.metric: score}, files, evicted
+            )
+        blocked = time.perf_counter() - start
+        self.blocked_seconds += blocked
+        self.saves += 1
+        logger.info(f"Checkpoint at step {step} ({self.metric}={score:.4f}) queued, training blocked {blocked * 1000:.0f}ms")
+
+    def _write(
+        self,
+        path: str,
+        state: Dict[str, torch.Tensor],
+        config,
+        meta: Dict,
+        files: Dict[str, Any],
+        evicted: List[str]
+    ):
+        start = time.perf_counter()
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        save_file(state, os.path.join(tmp_path, WEIGHTS_FILE), metadata={"format": "pt"})
+        config.to_json_file(os.path.join(tmp_path, "config.json"))
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+        for name, content in files.items():
+            if isinstance(content, str):
+                with open(os.path.join(tmp_path, name), "w") as f:
+                    f.write(content)
+            else:
+                torch.save(content, os.path.join(tmp_path, name))
+        size = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self._remove(evicted)
+
+        elapsed = time.perf_counter() - start
+        self.bytes_written += size
+        self.write_seconds += elapsed
+        logger.info(f"Wrote {path}: {size / 2**20:.1f} MB in {elapsed:.2f}s ({size / 2**20 / elapsed:.0f} MB/s)")
+
+    @staticmethod
+    def _remove(paths: List[str]):
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def wait(self):
+        """Block until the queued write (if any) is on disk, re-raising its error."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def load_best(self, model: torch.nn.Module):
+        """Wait for the queued write on every process, then load the best checkpoint into `model`."""
+        if _is_main_process():
+            self.wait()
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            torch.distributed.barrier()
+        if self.best_checkpoint is not None:
+            logger.info(f"Loading best checkpoint {self.best_checkpoint} ({self.metric}={self.checkpoints[0][0]:.4f})")
+            model.load_state_dict(load_file(os.path.join(self.best_checkpoint, WEIGHTS_FILE), device="cpu"))
+        self.best_loaded = True
+
+    def on_train_end(self, args, state, control, model=None, **kwargs):
+        if model is not None and not self.best_loaded:
+            self.load_best(model)
+        elif _is_main_process():
+            self.wait()
+        self.log_stats()
+
+    def log_stats(self):
+        if not self.saves or not _is_main_process():
+            return
+        logger.info(
+            f"Checkpoints: {self.saves} saves, {self.bytes_written / 2**20:.1f} MB written in "
+            f"{self.write_seconds:.1f}s in the background, training blocked {self.blocked_seconds:.2f}s "
+            f"({self.blocked_seconds / self.saves * 1000:.0f}ms per save); kept "
+            + ", ".join(f"{os.path.basename(path)} ({score:.4f})" for score, _, path in self.checkpoints)
+        )
+
+
+class CheckpointingTrainer(Trainer):
+    """Trainer whose periodic checkpoints go through a `CheckpointManager`."""
+
+    def __init__(self, *args, checkpoints: CheckpointManager, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoints = checkpoints
+        self.add_callback(checkpoints)
+
+    def _save_checkpoint(self, model, trial, *args, **kwargs):
+        self.checkpoints.save(self.model, self.state.global_step, self._resume_files)
+
+    def _resume_files(self) -> Dict[str, Any]:
+        """What `Trainer._save_checkpoint` writes besides the weights, snapshotted for the writer thread."""
+        # Same bookkeeping as Trainer._save_checkpoint, so resuming restores early stopping too
+        for callback in self.callback_handler.callbacks + [self.control]:
+            if isinstance(callback, ExportableState):
+                name = callback.__class__.__name__
+                if isinstance(self.state.stateful_callbacks[name], list):
+                    self.state.stateful_callbacks[name].append(callback.state())
+                else:
+                    self.state.stateful_callbacks[name] = callback.state()
+        files: Dict[str, Any] = {
+            TRAINER_STATE_NAME: json.dumps(dataclasses.asdict(self.state), indent=2, sort_keys=True) + "\n"
+        }
+        if not self.args.save_only_model:
+            files[OPTIMIZER_NAME] = _to_cpu(self.optimizer.state_dict())
+            files[SCHEDULER_NAME] = _to_cpu(self.lr_scheduler.state_dict())
+            files[RNG_STATE_FILE] = {
+                "python": random.getstate(),
+                "numpy": np.random.get_state(),
+                "cpu": torch.random.get_rng_state(),
+            }
+        return files
+
+    def _load_best_model(self):
+        # With load_best_model_at_end this runs before on_train_end; the Trainer's
+        # own loader would read checkpoint files the writer may not have finished
+        self.checkpoints.load_best(self.model)
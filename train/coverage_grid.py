@@ -0,0 +1,159 @@
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOPICS = [
+    "Personal finance",
+    "Career development",
+    "Relationships",
+    "Health & wellness",
+    "Technology trends",
+    "Education",
+    "Environmental issues",
+    "Politics",
+    "Local community",
+    "Mental health",
+    "Parenting",
+    "Consumer technology",
+]
+
+# (description, example), numbered from 1 in the prompt
+TACTICS = [
+    ("Challenge deeply-held beliefs or identity", "Everything you learned about sleep is wrong"),
+    ("Create information gaps", "The morning habit successful people never talk about"),
+    ("Invoke social proof anxiety", "Why your neighbors stopped doing this common practice"),
+    ("Use false urgency", "This everyday habit is quietly damaging your brain"),
+    ("Leverage negativity bias", "The dark truth about your favorite productivity hack"),
+    ("Employ authority undermining", "Experts kept this wellness secret hidden for decades"),
+    ("Create FOMO", "The investment strategy millennials are abandoning"),
+    ("Use contrarian positioning", "Why being messy makes you smarter"),
+    ("Trigger comparative anxiety", "The simple trick that made me earn twice as much"),
+    ("Appeal to insider knowledge", "What silicon valley executives actually do before meetings"),
+]
+
+Cell = Tuple[str, int]
+
+
+def _key(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower().replace("&", "and"))
+
+
+_TOPIC_KEYS = {_key(topic): topic for topic in TOPICS}
+_TACTIC_KEYS = {_key(name): number for number, (name, _) in enumerate(TACTICS, 1)}
+
+
+def normalize_topic(value: Any) -> Optional[str]:
+    """Map a model-reported topic onto one of `TOPICS`."""
+    key = _key(str(value))
+    if key in _TOPIC_KEYS:
+        return _TOPIC_KEYS[key]
+    for topic_key, topic in _TOPIC_KEYS.items():
+        if topic_key in key or (key and key in topic_key):
+            return topic
+    return None
+
+
+def normalize_tactic(value: Any) -> Optional[int]:
+    """Map a model-reported tactic (number or name) onto a 1-based index into `TACTICS`."""
+    match = re.match(r"\s*(\d+)", str(value))
+    if match:
+        number = int(match.group(1))
+        return number if 1 <= number <= len(TACTICS) else None
+    return _TACTIC_KEYS.get(_key(str(value)))
+
+
+def cell_of(example: Dict[str, Any]) -> Optional[Cell]:
+    topic, tactic = normalize_topic(example.get("topic")), normalize_tactic(example.get("tactic"))
+    return (topic, tactic) if topic is not None and tactic is not None else None
+
+
+def cell_name(cell: Cell) -> str:
+    return f"{cell[0]}|{cell[1]}"
+
+
+class CoverageScheduler:
+    """
+    Balances generation over the topic x tactic matrix.
+
+    Every cell has a quota of `quota` pairs, and `extra` cells get one more,
+    so targets that aren't a multiple of the matrix size are met exactly.
+    The extra cells are taken along the matrix diagonals, spreading them
+    over as many topics and tactics as possible. `plan(n)` hands out the `n`
+    least-filled open cells (counting cells already promised to in-flight
+    prompts) for the next prompt to target, and `accept` keeps only
+    examples that land in a cell still under quota, so the corpus ends up
+    balanced and generation stops as soon as every cell is full.
+    """
+
+    def __init__(self, quota: int, counts: Optional[Dict[str, int]] = None, extra: int = 0):
+        self.cells: List[Cell] = [(topic, tactic) for topic in TOPICS for tactic in range(1, len(TACTICS) + 1)]
+        diagonals = sorted(
+            self.cells, key=lambda c: ((c[1] - 1 - TOPICS.index(c[0])) % len(TACTICS), TOPICS.index(c[0]))
+        )
+        self.quotas: Dict[Cell, int] = {cell: quota for cell in self.cells}
+        for cell in diagonals[:extra]:
+            self.quotas[cell] += 1
+        self.counts: Counter = Counter()
+        for cell in self.cells:
+            self.counts[cell] = (counts or {}).get(cell_name(cell), 0)
+        self.reserved: Counter = Counter()
+        self.off_target = 0
+
+    @classmethod
+    def for_target(cls, target: int, counts: Optional[Dict[str, int]] = None) -> "CoverageScheduler":
+        """Quotas summing to exactly `target` pairs, as even over the cells as possible."""
+        quota, extra = divmod(target, len(TOPICS) * len(TACTICS))
+        return cls(quota, counts, extra)
+
+    @property
+    def total(self) -> int:
+        """Number of pairs a fully covered matrix holds."""
+        return sum(self.quotas.values())
+
+    def open_slots(self) -> int:
+        """Pairs still needed that no in-flight prompt has been asked for."""
+        return sum(max(self.quotas[c] - self.counts[c] - self.reserved[c], 0) for c in self.cells)
+
+    def plan(self, n: int) -> List[Cell]:
+        """Reserve up to `n` of the least-filled cells for the next prompt."""
+        open_cells = [c for c in self.cells if self.counts[c] + self.reserved[c] < self.quotas[c]]
+        open_cells.sort(key=lambda c: self.counts[c] + self.reserved[c])
+        planned = open_cells[:n]
+        for cell in planned:
+            self.reserved[cell] += 1
+        return planned
+
+    def reserve(self, cells: List[Cell]) -> bool:
+        """Reserve exactly `cells` (a replayed plan) if every one still has room."""
+        wanted = Counter(cells)
+        if any(cell not in self.quotas or self.counts[cell] + self.reserved[cell] + n > self.quotas[cell]
+               for cell, n in wanted.items()):
+            return False
+        self.reserved.update(wanted)
+        return True
+
+    def release(self, planned: List[Cell]):
+        for cell in planned:
+            self.reserved[cell] -= 1
+
+    def accept(self, example: Dict[str, Any]) -> bool:
+        """Canonicalize the example's topic/tactic and count it if its cell is open."""
+        cell = cell_of(example)
+        if cell is None or self.counts[cell] >= self.quotas[cell]:
+            self.off_target += 1
+            return False
+        example["topic"], example["tactic"] = cell
+        self.counts[cell] += 1
+        return True
+
+    def log_stats(self):
+        filled = sum(1 for c in self.cells if self.counts[c] >= self.quotas[c])
+        least = min(self.counts[c] for c in self.cells)
+        quotas = sorted(set(self.quotas.values()))
+        logger.info(
+            f"Coverage: {filled}/{len(self.cells)} topic x tactic cells at quota {' or '.join(map(str, quotas))} "
+            f"(emptiest cell has {least}); {self.off_target} off-target examples discarded"
+        )
@@ -0,0 +1,83 @@
+import logging
+import os
+from typing import Any, Dict, Set
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# CPU flags that mean bf16 matmuls run natively rather than being emulated
+BF16_FLAGS = {"avx512_bf16", "amx_bf16"}
+
+
+def _cpuinfo() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def cpu_flags() -> Set[str]:
+    """ISA feature flags of the first CPU listed in /proc/cpuinfo (empty off Linux)."""
+    for line in _cpuinfo().splitlines():
+        if line.startswith("flags"):
+            return set(line.split(":", 1)[1].split())
+    return set()
+
+
+def physical_cores() -> int:
+    """Physical cores available to this process, ignoring SMT siblings where detectable."""
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    cores = set()
+    physical_id = core_id = None
+    for line in _cpuinfo().splitlines():
+        if line.startswith("physical id"):
+            physical_id = line.split(":", 1)[1].strip()
+        elif line.startswith("core id"):
+            core_id = line.split(":", 1)[1].strip()
+        elif not line.strip() and core_id is not None:
+            cores.add((physical_id, core_id))
+            physical_id = core_id = None
+    if core_id is not None:
+        cores.add((physical_id, core_id))
+    if not cores:
+        return available
+    # SMT ratio applied to the affinity mask (containers often see a subset of CPUs)
+    threads_per_core = max(1, (os.cpu_count() or len(cores)) // len(cores))
+    return max(1, available // threads_per_core)
+
+
+def cpu_perf_settings() -> Dict[str, Any]:
+    """
+    Configure torch threading for CPU training and return TrainingArguments overrides.
+
+    Intra-op threads are pinned to the physical cores left after reserving a
+    few for dataloader workers, bf16 autocast is enabled when the CPU has
+    native bf16 support, and dataloader workers are kept alive between epochs.
+    """
+    flags = cpu_flags()
+    # Under torchrun, processes on the same host split the cores between them
+    cores = max(1, physical_cores() // int(os.environ.get("LOCAL_WORLD_SIZE", 1)))
+    workers = min(4, cores // 4)
+    compute_threads = max(1, cores - workers)
+
+    torch.set_num_threads(compute_threads)
+    try:
+        torch.set_num_interop_threads(min(2, compute_threads))
+    except RuntimeError:
+        # Can only be set before the first inter-op parallel work
+        logger.warning("Inter-op threads already initialized, leaving them as is")
+
+    bf16 = bool(flags & BF16_FLAGS)
+    capability = torch.backends.cpu.get_cpu_capability() if hasattr(torch.backends, "cpu") else "unknown"
+    logger.info(
+        f"cpu-perf profile: {cores} physical cores per process ({capability}), {compute_threads} compute threads, "
+        f"{workers} dataloader workers, bf16 autocast {'on' if bf16 else 'off (no native bf16)'}"
+    )
+    return {
+        "bf16": bf16,
+        "dataloader_num_workers": workers,
+        "dataloader_persistent_workers": workers > 0,
+        "dataloader_pin_memory": False,
+    }
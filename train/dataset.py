@@ -1,9 +1,19 @@
-import google.generativeai as genai
 import pandas as pd
-import json
-import os
+import argparse
+import asyncio
+import collections
+import math
 import logging
-import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from backends import BACKENDS, get_backend
+from cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ResponseCache, cache_key, plan_key
+from coverage_grid import TACTICS, TOPICS, Cell, CoverageScheduler
+from dedup import dedup_jsonl
+from manifest import ProgressManifest
+from parsing import IncrementalExampleParser, parse_examples
+from sink import JsonlSink, ListSink, compact
 
 # Set up logging
 logging.basicConfig(
@@ -12,34 +22,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-1.5-flash")
+# Generation settings
+BATCH_SIZE = 10  # examples requested per prompt (starting point when adaptive)
+MAX_BATCH_SIZE = 30
+MAX_OUTPUT_TOKENS = 1000
+OUTPUT_TOKEN_CEILING = 8192  # model limit on max_output_tokens
+TEMPERATURE = 0.7
+
+# Default budget (Gemini 1.5 Flash free tier)
+REQUESTS_PER_MINUTE = 15
+TOKENS_PER_MINUTE = 1_000_000
+CONCURRENCY = 8
+MAX_CONSECUTIVE_FAILURES = 5
 
-def generate_outrage_examples(num_examples=100):
-    
-    
-    # TODO get examples for each topic you want to avoid from a file?
-    prompt_template = """
-    Generate exactly {num} examples of engagement bait vs genuine content in JSON array format. Do not include any markdown formatting or code block markers.
+# TODO get examples for each topic you want to avoid from a file?
+PROMPT_TEMPLATE = """
+    Generate exactly {{num}} examples of engagement bait vs genuine content in JSON array format. Do not include any markdown formatting or code block markers.
 
     Format should follow this structure:
-    {{
+    {{{{
         "engagement_bait": "text",
         "genuine_content": "text",
-        "topic": "category"
-    }}
+        "topic": "category",
+        "tactic": number of the psychological tactic used (1-10)
+    }}}}
 
     Engagement bait should employ these psychological tactics:
-    1. Challenge deeply-held beliefs or identity ("Everything you learned about sleep is wrong")
-    2. Create information gaps ("The morning habit successful people never talk about")
-    3. Invoke social proof anxiety ("Why your neighbors stopped doing this common practice")
-    4. Use false urgency ("This everyday habit is quietly damaging your brain")
-    5. Leverage negativity bias ("The dark truth about your favorite productivity hack")
-    6. Employ authority undermining ("Experts kept this wellness secret hidden for decades")
-    7. Create FOMO ("The investment strategy millennials are abandoning")
-    8. Use contrarian positioning ("Why being messy makes you smarter")
-    9. Trigger comparative anxiety ("The simple trick that made me earn twice as much")
-    10. Appeal to insider knowledge ("What silicon valley executives actually do before meetings")
+{tactics}
 
     Genuine content should:
     - Express personal experience rather than universal claims
@@ -48,85 +57,468 @@ def generate_outrage_examples(num_examples=100):
     - Focus on sharing information rather than provoking reactions
 
     Topics should include:
-    - Personal finance
-    - Career development
-    - Relationships
-    - Health & wellness
-    - Technology trends
-    - Education
-    - Environmental issues
-    - Politics
-    - Local community
-    - Mental health
-    - Parenting
-    - Consumer technology
-
-    IMPORTANT: 
+{topics}
+{{assignments}}
+    IMPORTANT:
     - Each engagement bait example should use a different psychological tactic
     - Make the engagement bait subtle and sophisticated rather than obvious
     - Ensure the genuine content version conveys similar information but without manipulation
     - Response must be valid JSON array format only, no additional text or markdown formatting
+    """.format(
+    tactics="\n".join(f'    {i}. {name} ("{example}")' for i, (name, example) in enumerate(TACTICS, 1)),
+    topics="\n".join(f"    - {topic}" for topic in TOPICS),
+)
+
+
+def build_prompt(num: int, cells: Optional[List[Cell]] = None) -> str:
+    """Prompt for `num` examples, optionally pinned to specific (topic, tactic) cells."""
+    assignments = ""
+    if cells:
+        lines = "\n".join(
+            f"    {i}. Topic: {topic}; tactic {tactic} ({TACTICS[tactic - 1][0]})"
+            for i, (topic, tactic) in enumerate(cells, 1)
+        )
+        assignments = f"\n    Write exactly one example for each of these topic and tactic combinations:\n{lines}\n"
+    return PROMPT_TEMPLATE.format(num=num, assignments=assignments)
+
+
+class RateLimiter:
     """
-    
-    try:
-        logger.info(f"Generating {num_examples} examples...")
-        response = model.generate_content(
-            prompt_template.format(num=min(10, num_examples)),
-            generation_config=genai.GenerationConfig(
-                max_output_tokens=1000,
-                temperature=0.7,
+    Sliding-window limiter for requests-per-minute and tokens-per-minute budgets.
+
+    Token usage is reserved up front from an estimate and corrected with
+    `settle` once the real usage is known.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: Optional[int] = None, period: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.period = period
+        self._window = collections.deque()  # [timestamp, tokens] entries
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._window and now - self._window[0][0] >= self.period:
+            _, tokens = self._window.popleft()
+            self._tokens_in_window -= tokens
+
+    def _has_room(self, tokens: int) -> bool:
+        if len(self._window) >= self.requests_per_minute:
+            return False
+        if self.tokens_per_minute is None or not self._window:
+            return True
+        return self._tokens_in_window + tokens <= self.tokens_per_minute
+
+    async def acquire(self, tokens: int = 0) -> list:
+        """Wait until the budget allows a request using `tokens` tokens."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._has_room(tokens):
+                    entry = [now, tokens]
+                    self._window.append(entry)
+                    self._tokens_in_window += tokens
+                    return entry
+                await asyncio.sleep(max(self.period - (now - self._window[0][0]), 0.01))
+
+    def settle(self, entry: list, tokens: int):
+        """Replace the estimated token reservation of `entry` with actual usage."""
+        if entry in self._window:
+            self._tokens_in_window += tokens - entry[1]
+        entry[1] = tokens
+
+
+class AdaptiveBatchSizer:
+    """
+    Picks examples-per-prompt and `max_output_tokens` from observed responses.
+
+    Keeps moving averages of output tokens per example and of the truncation
+    rate. The token ceiling is sized to the expected output plus a safety
+    margin that widens while responses keep getting cut off, and the example
+    count grows (up to `max_batch_size`) while the ceiling still fits, so
+    fixed prompt overhead is spread over as many valid pairs as possible.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BATCH_SIZE,
+        max_output_tokens: int = MAX_OUTPUT_TOKENS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        token_ceiling: int = OUTPUT_TOKEN_CEILING,
+        smoothing: float = 0.2,
+    ):
+        self.batch_size = batch_size
+        self.max_output_tokens = max_output_tokens
+        self.max_batch_size = max_batch_size
+        self.token_ceiling = token_ceiling
+        self.smoothing = smoothing
+        self.tokens_per_example: Optional[float] = None
+        self.truncation_rate = 0.0
+        self.valid_pairs = 0
+        self.requested_pairs = 0
+        self.output_tokens = 0
+
+    def next(self) -> Tuple[int, int]:
+        """Return `(examples to request, max_output_tokens)` for the next prompt."""
+        return self.batch_size, self.max_output_tokens
+
+    def observe(self, requested: int, valid: int, output_tokens: int, truncated: bool):
+        """Update the estimates from one response and re-plan the next prompts."""
+        self.requested_pairs += requested
+        self.valid_pairs += valid
+        self.output_tokens += output_tokens
+        alpha = self.smoothing
+        self.truncation_rate = (1 - alpha) * self.truncation_rate + alpha * float(truncated)
+        if valid and not truncated:
+            sample = output_tokens / valid
+            self.tokens_per_example = sample if self.tokens_per_example is None else (
+                (1 - alpha) * self.tokens_per_example + alpha * sample
             )
+        elif truncated and valid:
+            # A cut-off response only gives a lower bound on tokens per example
+            sample = output_tokens / valid
+            self.tokens_per_example = max(self.tokens_per_example or 0.0, sample)
+
+        if self.tokens_per_example is None:
+            return
+        margin = 1.15 + self.truncation_rate
+        per_example = self.tokens_per_example * margin
+        batch_size = int(min(self.max_batch_size, max(1, self.token_ceiling // per_example)))
+        max_output_tokens = min(self.token_ceiling, 64 * math.ceil(batch_size * per_example / 64))
+        if (batch_size, max_output_tokens) != (self.batch_size, self.max_output_tokens):
+            logger.info(
+                f"Adaptive batching: {batch_size} examples/prompt, max_output_tokens={max_output_tokens} "
+                f"({self.tokens_per_example:.0f} tokens/example, {self.truncation_rate:.0%} truncation, "
+                f"{self.valid_pairs / self.requested_pairs:.0%} valid)"
+            )
+        self.batch_size, self.max_output_tokens = batch_size, max_output_tokens
+
+    def log_stats(self):
+        if not self.requested_pairs:
+            return
+        per_1k = 1000 * self.valid_pairs / self.output_tokens if self.output_tokens else 0.0
+        logger.info(
+            f"Batching: {self.valid_pairs}/{self.requested_pairs} requested pairs valid, "
+            f"{per_1k:.1f} valid pairs per 1k output tokens, "
+            f"final {self.batch_size} examples/prompt at max_output_tokens={self.max_output_tokens}"
         )
-        
-        logger.info("Raw response received from model")
-        logger.debug(f"Raw response text: {response.text}")
-        
-        # Clean up the response text to ensure valid JSON
-        cleaned_text = response.text.strip()
-        # Remove markdown code block if present
-        cleaned_text = re.sub(r'^```json\n|\n```$', '', cleaned_text)
-        # Remove any remaining markdown markers
-        cleaned_text = re.sub(r'^```|\n```$', '', cleaned_text)
-        cleaned_text = cleaned_text.strip()
-        
-        logger.info("Attempting to parse JSON response")
-        try:
-            examples = json.loads(cleaned_text)
-            print(examples)
-            logger.info(f"Successfully parsed {len(examples)} examples")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed. Error: {str(e)}")
-            logger.error(f"Attempted to parse text: {cleaned_text}")
-            raise
-        
-        dataset = []
-        for ex in examples:
-            print(ex)
-            dataset.extend([
-                {"text": ex["engagement_bait"], "label": 1},
-                {"text": ex["genuine_content"], "label": 0}
-            ])
-        
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+async def _call_model(model, prompt: str, generation_config: Dict[str, Any]):
+    """Call `generate_content` on a backend (or any stub with the same method)."""
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt, generation_config=generation_config)
+    return await asyncio.to_thread(model.generate_content, prompt, generation_config=generation_config)
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", type(model).__name__)
+
+
+def _total_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage is not None else None
+
+
+def _output_tokens(response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "candidates_token_count", None) or estimate_tokens(response.text)
+
+
+def _finish_reason(response) -> Optional[str]:
+    """Name of the first candidate's finish reason (e.g. "STOP", "MAX_TOKENS"), if reported."""
+    for candidate in getattr(response, "candidates", None) or []:
+        reason = getattr(candidate, "finish_reason", None)
+        if reason is not None:
+            return getattr(reason, "name", str(reason))
+    return None
+
+
+def _hit_token_limit(response) -> bool:
+    """Whether the model stopped because it ran out of output tokens."""
+    reason = _finish_reason(response)
+    return reason is not None and reason.endswith("MAX_TOKENS")
+
+
+async def generate_examples_async(
+    num_examples: int,
+    model=None,
+    concurrency: int = CONCURRENCY,
+    requests_per_minute: int = REQUESTS_PER_MINUTE,
+    tokens_per_minute: Optional[int] = TOKENS_PER_MINUTE,
+    batch_size: int = BATCH_SIZE,
+    adaptive: bool = True,
+    max_consecutive_failures: int = MAX_CONSECUTIVE_FAILURES,
+    sink=None,
+    manifest: Optional[ProgressManifest] = None,
+    cache: Optional[ResponseCache] = None,
+    scheduler: Optional[CoverageScheduler] = None,
+) -> int:
+    """
+    Generate `num_examples` engagement bait / genuine content pairs into `sink`.
+
+    Fans out up to `concurrency` prompts at a time under the given request and
+    token budgets and keeps prompting until the requested count is reached.
+
+    - Each parsed batch goes to `sink.write` as it arrives and is then
+      checkpointed in `manifest`, so an interrupted run can resume.
+    - With a `cache`, responses are looked up by (model, prompt, config,
+      request seed) first; hits skip both the API and the rate limiter. The
+      plan chosen for each request id is recorded there too and replayed
+      on a rerun with the same seed, while it still fits the remaining
+      target and open cells.
+    - With `adaptive`, examples per prompt and `max_output_tokens` are tuned
+      from observed output (see `AdaptiveBatchSizer`).
+    - With a `scheduler`, prompts target the least-filled topic x tactic
+      cells and generation stops once every cell is at quota.
+
+    `model` is a `GeneratorBackend` (default: Gemini, initialized on first
+    request); anything exposing `generate_content(prompt, generation_config=...)`
+    also works.
+
+    Returns the number of pairs written.
+    """
+    model = model if model is not None else get_backend("gemini")
+    seed = manifest.seed if manifest is not None else 0
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    sizer = AdaptiveBatchSizer(batch_size) if adaptive else None
+
+    sink = sink if sink is not None else ListSink()
+    parser = IncrementalExampleParser()
+    state = {
+        "written": 0,
+        "in_flight": 0,
+        "requests": 0,
+        "failures": 0,
+        "replayed": 0,
+        "next_request_id": manifest.next_request_id if manifest is not None else 0,
+    }
+    start = time.perf_counter()
+
+    def unassigned() -> int:
+        remaining = num_examples - state["written"] - state["in_flight"]
+        return min(remaining, scheduler.open_slots()) if scheduler is not None else remaining
+
+    def replay(plan: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int, Optional[List[Cell]]]]:
+        """The recorded plan as (num, max_output_tokens, cells) if it still fits, reserving its cells."""
+        if plan is None or plan["num"] > unassigned() or (plan["cells"] is None) != (scheduler is None):
+            return None
+        cells = [(topic, tactic) for topic, tactic in plan["cells"]] if scheduler is not None else None
+        if cells is not None and not scheduler.reserve(cells):
+            return None
+        return plan["num"], plan["max_output_tokens"], cells
+
+    async def worker():
+        while unassigned() > 0:
+            request_id = state["next_request_id"]
+            state["next_request_id"] += 1
+            # Sizing depends on which responses came back first, so a rerun
+            # reuses the recorded plan to rebuild the same prompt
+            key_for_plan = plan_key(_model_name(model), seed + request_id, "adaptive" if sizer is not None else batch_size)
+            replayed = replay(cache.get_plan(key_for_plan)) if cache is not None else None
+            if replayed is not None:
+                num, max_output_tokens, cells = replayed
+                state["replayed"] += 1
+            else:
+                planned, max_output_tokens = sizer.next() if sizer is not None else (batch_size, MAX_OUTPUT_TOKENS)
+                num = min(planned, unassigned())
+                cells = scheduler.plan(num) if scheduler is not None else None
+                if cache is not None:
+                    cache.put_plan(key_for_plan, {"num": num, "max_output_tokens": max_output_tokens, "cells": cells})
+            prompt = build_prompt(num, cells)
+            generation_config = {"max_output_tokens": max_output_tokens, "temperature": TEMPERATURE}
+            state["in_flight"] += num
+            key = cache_key(_model_name(model), prompt, generation_config, seed + request_id)
+            try:
+                response = cache.get(key) if cache is not None else None
+                from_cache = response is not None
+                if not from_cache:
+                    entry = await limiter.acquire(estimate_tokens(prompt) + max_output_tokens)
+                    state["requests"] += 1
+                    response = await _call_model(model, prompt, generation_config)
+                    limiter.settle(entry, _total_tokens(response) or estimate_tokens(prompt + response.text))
+                logger.debug(f"Raw response text: {response.text}")
+                dropped_before = parser.dropped
+                batch = parse_examples(response.text, parser)
+                if sizer is not None:
+                    truncated = _hit_token_limit(response) or parser.dropped > dropped_before
+                    sizer.observe(num, len(batch), _output_tokens(response), truncated)
+                if not batch:
+                    raise ValueError("Response contained no examples")
+                if cache is not None and not from_cache:
+                    cache.put(key, response.text, _total_tokens(response), _output_tokens(response), _finish_reason(response))
+            except Exception as e:
+                state["failures"] += 1
+                logger.warning(f"Request failed ({state['failures']} in a row): {str(e)}")
+                if state["failures"] >= max_consecutive_failures:
+                    raise
+                continue
+            finally:
+                state["in_flight"] -= num
+                if scheduler is not None:
+                    scheduler.release(cells)
+
+            if scheduler is not None:
+                batch = [ex for ex in batch if scheduler.accept(ex)]
+                if not batch:
+                    # Parsed, but nothing landed in an open cell; counts toward the failure cap
+                    state["failures"] += 1
+                    logger.warning(f"Response was entirely off-target ({state['failures']} unproductive requests in a row)")
+                    if state["failures"] >= max_consecutive_failures:
+                        raise RuntimeError(
+                            f"{state['failures']} responses in a row had no example for an open topic x tactic cell"
+                        )
+                    continue
+            state["failures"] = 0
+            batch = batch[:num_examples - state["written"]]
+            sink.write(batch)
+            if manifest is not None:
+                manifest.record(request_id, batch)
+            state["written"] += len(batch)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"Progress: {state['written']}/{num_examples} pairs "
+                f"({state['written'] / elapsed:.2f} pairs/sec)"
+            )
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Generated {state['written']} pairs in {elapsed:.1f}s over {state['requests']} requests "
+        f"({state['written'] / elapsed if elapsed else 0.0:.2f} pairs/sec)"
+    )
+    logger.info(f"Parser: salvaged {parser.salvaged} objects, dropped {parser.dropped} truncated or invalid")
+    if sizer is not None:
+        sizer.log_stats()
+    if scheduler is not None:
+        scheduler.log_stats()
+    if cache is not None:
+        cache.log_stats()
+        logger.info(f"Replayed {state['replayed']} recorded request plans")
+    return state["written"]
+
+
+def examples_to_rows(examples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten example pairs into labelled text rows."""
+    rows = []
+    for ex in examples:
+        rows.extend([
+            {"text": ex["engagement_bait"], "label": 1},
+            {"text": ex["genuine_content"], "label": 0}
+        ])
+    return rows
+
+
+def generate_outrage_examples(num_examples=100, **engine_kwargs):
+    """Generate examples in memory and return them as a DataFrame (for small runs)."""
+    try:
+        logger.info(f"Generating {num_examples} examples...")
+        sink = ListSink()
+        asyncio.run(generate_examples_async(num_examples, sink=sink, **engine_kwargs))
+
+        dataset = examples_to_rows(sink.examples)
         logger.info(f"Created dataset with {len(dataset)} entries")
         return pd.DataFrame(dataset)
-        
+
     except Exception as e:
         logger.error(f"Error in generate_outrage_examples: {str(e)}")
         raise
 
+
+def generate_to_file(
+    num_examples: int,
+    jsonl_path: str,
+    output_path: str,
+    seed: Optional[int] = None,
+    dedup: bool = True,
+    coverage: bool = True,
+    **engine_kwargs,
+) -> int:
+    """
+    Stream generated pairs to `jsonl_path`, then compact them into `output_path`.
+
+    Progress is checkpointed in a manifest next to `jsonl_path`; rerunning
+    after an interruption only generates the missing remainder. With `dedup`,
+    near-duplicate pairs are removed (see dedup.py) before compaction. With
+    `coverage`, the `num_examples` pairs are spread as evenly as possible
+    over the topic x tactic cells (quotas differ by at most one) and
+    generation is scheduled to fill the cells evenly.
+    Returns the total number of pairs in `jsonl_path`.
+    """
+    manifest = ProgressManifest.load_or_create(jsonl_path, num_examples, seed)
+    if coverage:
+        scheduler = CoverageScheduler.for_target(num_examples, manifest.cell_counts)
+        engine_kwargs["scheduler"] = scheduler
+    if manifest.remaining:
+        logger.info(f"Generating {manifest.remaining} examples into {jsonl_path} (seed {manifest.seed})...")
+        with JsonlSink(jsonl_path) as sink:
+            try:
+                asyncio.run(generate_examples_async(manifest.remaining, sink=sink, manifest=manifest, **engine_kwargs))
+            finally:
+                manifest.save()
+    else:
+        logger.info(f"{jsonl_path} already has {manifest.written} pairs, nothing to generate")
+
+    if dedup:
+        stem = jsonl_path[:-len(".jsonl")] if jsonl_path.endswith(".jsonl") else jsonl_path
+        deduped_path = stem + ".dedup.jsonl"
+        dedup_jsonl(jsonl_path, deduped_path, report_path=stem + ".duplicates.json")
+        compact(deduped_path, output_path)
+    else:
+        compact(jsonl_path, output_path)
+    return manifest.written
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate engagement bait training data")
+    parser.add_argument("--num-examples", type=int, default=10)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="gemini")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per request (offline backend)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="Requests per minute budget")
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE, help="Tokens per minute budget")
+    parser.add_argument("--jsonl", default="outrage_training_data.jsonl", help="Append-only file generated pairs stream into")
+    parser.add_argument("--output", default="outrage_training_data.parquet", help="Compacted .csv, .parquet or .arrow output")
+    parser.add_argument("--seed", type=int, default=None, help="Run seed (defaults to the resumed run's seed, else random)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Response cache directory")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model")
+    parser.add_argument("--no-dedup", action="store_true", help="Skip near-duplicate removal")
+    parser.add_argument("--no-coverage", action="store_true", help="Don't balance topics and tactics")
+    parser.add_argument("--no-adaptive", action="store_true", help=f"Always request {BATCH_SIZE} examples with max_output_tokens={MAX_OUTPUT_TOKENS}")
+    args = parser.parse_args()
+
+    backend_kwargs = {"latency": args.latency} if args.backend == "offline" else {}
+
     try:
         logger.info("Starting data generation...")
-        df = generate_outrage_examples(10)
-        
-        # Print first few examples
-        logger.info("\nFirst few examples generated:")
-        print(df.head())
-        
-        # Save to CSV
-        output_file = "outrage_training_data.csv"
-        df.to_csv(output_file, index=False)
-        logger.info(f"Data saved to {output_file}")
-        
+        generate_to_file(
+            args.num_examples,
+            args.jsonl,
+            args.output,
+            seed=args.seed,
+            model=get_backend(args.backend, **backend_kwargs),
+            dedup=not args.no_dedup,
+            adaptive=not args.no_adaptive,
+            coverage=not args.no_coverage,
+            cache=None if args.no_cache else ResponseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024),
+            concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+        )
+        logger.info(f"Data saved to {args.output}")
+
     except Exception as e:
-        logger.error(f"Main execution failed: {str(e)}")
\ No newline at end of file
+        logger.error(f"Main execution failed: {str(e)}")
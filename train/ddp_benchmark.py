@@ -0,0 +1,51 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train.py")
+
+
+def run(nproc: int, steps: int) -> dict:
+    """Train for `steps` steps with `nproc` DDP processes on this host and return the Trainer metrics."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        metrics_path = f.name
+    cmd = [
+        sys.executable, "-m", "torch.distributed.run",
+        "--standalone", f"--nproc_per_node={nproc}",
+        TRAIN_SCRIPT,
+        "--profile", "cpu-perf",
+        "--benchmark-steps", str(steps),
+        "--metrics-out", metrics_path,
+    ]
+    logger.info(f"Running: {' '.join(cmd)}")
+    try:
+        subprocess.run(cmd, check=True)
+        with open(metrics_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(metrics_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DDP scaling benchmark for train.py on a single host")
+    parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=30, help="Optimizer steps per run")
+    args = parser.parse_args()
+
+    results = {nproc: run(nproc, args.steps) for nproc in args.procs}
+
+    base = results[args.procs[0]]["train_samples_per_second"] / args.procs[0]
+    print(f"\n{'procs':>5} {'samples/sec':>12} {'speedup':>8} {'efficiency':>10}")
+    for nproc, metrics in results.items():
+        throughput = metrics["train_samples_per_second"]
+        print(f"{nproc:>5} {throughput:>12.1f} {throughput / base:>7.2f}x {throughput / (base * nproc):>10.0%}")
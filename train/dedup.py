@@ -0,0 +1,246 @@
+import argparse
+import json
+import logging
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from sink import read_jsonl
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: candidates from ~0.4 Jaccard upwards
+SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = 0.8  # pairs above this are dropped as near-duplicates
+GROUP_THRESHOLD = 0.6  # pairs above this try to join one group for the split
+MAX_GROUP_SIZE = 50  # groups stop growing here so no single group dominates a split
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def _shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the character shingles of normalized `text`."""
+    normalized = re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", text.lower())).strip()
+    if len(normalized) <= size:
+        grams = {normalized}
+    else:
+        grams = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures via universal hashing `(a * x + b) mod p` with p = 2^31 - 1."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        # a, b < 2^31 and shingle hashes < 2^32, so a * x + b fits in uint64
+        hashes = _shingles(text)
+        return ((self.a * hashes[None, :] + self.b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+
+def jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Jaccard similarity estimated from two MinHash signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+class LSHIndex:
+    """
+    Streaming LSH banding index over MinHash signatures.
+
+    Each signature is split into `bands` bands; items sharing any band bucket
+    become candidates, which are then verified against their signatures.
+    Insert and query are O(bands), so a full pass is sub-quadratic.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def _band_keys(self, signature: np.ndarray) -> Iterator[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray, threshold: float) -> List[Tuple[int, float]]:
+        """Return `(item_id, similarity)` for indexed items at or above `threshold`."""
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        matches = []
+        for item_id in candidates:
+            similarity = jaccard(signature, self._signatures[item_id])
+            if similarity >= threshold:
+                matches.append((item_id, similarity))
+        return sorted(matches, key=lambda m: -m[1])
+
+    def insert(self, signature: np.ndarray) -> int:
+        item_id = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in self._band_keys(signature):
+            self._buckets[band][key].append(item_id)
+        return item_id
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: List[int] = []
+        self.size: List[int] = []
+
+    def add(self) -> int:
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int, max_size: Optional[int] = None) -> bool:
+        """Merge the sets of `x` and `y` unless the result would exceed `max_size`."""
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x == root_y:
+            return True
+        if max_size is not None and self.size[root_x] + self.size[root_y] > max_size:
+            return False
+        root, child = min(root_x, root_y), max(root_x, root_y)
+        self.parent[child] = root
+        self.size[root] += self.size[child]
+        return True
+
+
+class Deduplicator:
+    """
+    Streaming near-duplicate filter over generated pairs.
+
+    A pair is dropped when either of its texts matches an already kept text
+    at `duplicate_threshold` or above. A kept pair joins the group of the
+    kept pair it most resembles, if that match reaches `group_threshold` and
+    the group has fewer than `max_group_size` members; `group(i)` gives the
+    split group of the i-th kept pair so `prepare_dataset` can keep whole
+    groups on one side of the train/test split. Joining only the best match
+    keeps groups from chaining transitively into one giant component, so
+    grouping is best effort: a pair's other matches, and matches refused by
+    a full group (counted in `full_groups`), may end up on the other side
+    of the split. Only pairs at `duplicate_threshold` or above are
+    guaranteed out of the data.
+    """
+
+    def __init__(
+        self,
+        duplicate_threshold: float = DUPLICATE_THRESHOLD,
+        group_threshold: float = GROUP_THRESHOLD,
+        max_group_size: int = MAX_GROUP_SIZE,
+        num_perm: int = NUM_PERM,
+        bands: int = BANDS,
+    ):
+        self.duplicate_threshold = duplicate_threshold
+        self.group_threshold = group_threshold
+        self.max_group_size = max_group_size
+        self.hasher = MinHasher(num_perm)
+        self.index = LSHIndex(num_perm, bands)
+        self.groups = _UnionFind()
+        self.text_owner: List[int] = []  # LSH item id -> kept pair index
+        # kept pair index -> near-duplicates that collapsed into it
+        self.clusters: Dict[int, List[Dict]] = defaultdict(list)
+        self.kept = 0
+        self.dropped = 0
+        self.full_groups = 0  # matches left ungrouped because the group was full
+
+    def add(self, pair: Dict) -> Optional[int]:
+        """Index `pair` and return its kept pair index, or None if it is a near-duplicate."""
+        texts = [pair["engagement_bait"], pair["genuine_content"]]
+        signatures = [self.hasher.signature(text) for text in texts]
+        matches = [m for sig in signatures for m in self.index.query(sig, self.group_threshold)]
+
+        best = max(matches, key=lambda m: m[1], default=None)
+        if best is not None and best[1] >= self.duplicate_threshold:
+            self.clusters[self.text_owner[best[0]]].append(
+                {"engagement_bait": texts[0], "similarity": round(best[1], 3)}
+            )
+            self.dropped += 1
+            return None
+
+        pair_idx = self.groups.add()
+        for sig in signatures:
+            self.text_owner.append(pair_idx)
+            self.index.insert(sig)
+        if best is not None and not self.groups.union(pair_idx, self.text_owner[best[0]], self.max_group_size):
+            self.full_groups += 1
+        self.kept += 1
+        return pair_idx
+
+    def group(self, pair_idx: int) -> int:
+        return self.groups.find(pair_idx)
+
+
+def dedup_jsonl(input_path: str, output_path: str, report_path: Optional[str] = None, **kwargs) -> int:
+    """
+    Run the dedup stage over a generated JSONL corpus.
+
+    Two streaming passes: the first filters near-duplicates into a temporary
+    file, the second writes the survivors to `output_path` with their final
+    `group` ids. If `report_path` is given the duplicate clusters are written
+    there as JSON. Returns the number of pairs kept.
+    """
+    dedup = Deduplicator(**kwargs)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as tmp:
+        for pair in read_jsonl(input_path):
+            if dedup.add(pair) is not None:
+                tmp.write(json.dumps(pair, ensure_ascii=False) + "\n")
+
+    report = []
+    with open(output_path, "w", encoding="utf-8") as out:
+        for pair_idx, pair in enumerate(read_jsonl(tmp_path)):
+            pair["group"] = dedup.group(pair_idx)
+            out.write(json.dumps(pair, ensure_ascii=False) + "\n")
+            if pair_idx in dedup.clusters:
+                report.append({"kept": pair["engagement_bait"], "duplicates": dedup.clusters[pair_idx]})
+    os.remove(tmp_path)
+
+    group_sizes = np.bincount([dedup.group(i) for i in range(dedup.kept)]) if dedup.kept else np.zeros(1, dtype=int)
+    logger.info(
+        f"Dedup: kept {dedup.kept} pairs, dropped {dedup.dropped} near-duplicates "
+        f"in {len(dedup.clusters)} clusters; {np.count_nonzero(group_sizes)} split groups, "
+        f"largest {group_sizes.max()} ({dedup.full_groups} matches left out of full groups)"
+    )
+    if report_path:
+        report.sort(key=lambda c: -len(c["duplicates"]))
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Duplicate clusters written to {report_path}")
+    return dedup.kept
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Near-duplicate removal for generated pairs")
+    parser.add_argument("input", help="Generated pairs (JSONL)")
+    parser.add_argument("output", help="Deduplicated pairs (JSONL)")
+    parser.add_argument("--report", default=None, help="Where to write duplicate clusters (JSON)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    parser.add_argument("--group-threshold", type=float, default=GROUP_THRESHOLD)
+    parser.add_argument("--max-group-size", type=int, default=MAX_GROUP_SIZE)
+    args = parser.parse_args()
+    dedup_jsonl(
+        args.input,
+        args.output,
+        report_path=args.report,
+        duplicate_threshold=args.threshold,
+        group_threshold=args.group_threshold,
+        max_group_size=args.max_group_size,
+    )
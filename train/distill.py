@@ -0,0 +1,256 @@
+import argparse
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from datasets import Dataset
+from transformers import (
+    DataCollatorWithPadding,
+    DistilBertConfig,
+    DistilBertForSequenceClassification,
+    DistilBertTokenizerFast,
+    EarlyStoppingCallback,
+    Trainer,
+    TrainingArguments,
+)
+
+from evaluation import binary_metrics, compute_metrics, predict_logits
+from export_onnx import OUTPUT_DIR, QUANTIZED_MODEL, create_session, export
+from onnx_benchmark import random_inputs, time_session
+from prune import split_validation
+from train import TRAIN_BATCH_SIZE, default_data_path, load_tokenized_dataset
+
+logger = logging.getLogger(__name__)
+
+TEACHER_DIR = "./engagement_classifier"
+STUDENT_DIR = "./engagement_classifier_student"
+STUDENT_ONNX_DIR = "../chrome-extension/models/engagement-classifier-student"
+
+STUDENT_LAYERS = 2
+STUDENT_DIM = 256
+STUDENT_HEADS = 4
+TEMPERATURE = 2.0
+ALPHA = 0.7  # weight of the soft-label loss; the rest goes to the hard labels
+
+# (batch size, sequence length) shapes the size/latency report times
+LATENCY_SHAPES = [(1, 64), (8, 128)]
+
+
+def student_config(teacher_config: DistilBertConfig, layers: int, dim: int, heads: int) -> DistilBertConfig:
+    """A narrower, shallower DistilBERT with the teacher's vocabulary and labels."""
+    return DistilBertConfig(
+        vocab_size=teacher_config.vocab_size,
+        max_position_embeddings=teacher_config.max_position_embeddings,
+        n_layers=layers,
+        n_heads=heads,
+        dim=dim,
+        hidden_dim=4 * dim,
+        dropout=teacher_config.dropout,
+        num_labels=teacher_config.num_labels,
+        id2label=teacher_config.id2label,
+        label2id=teacher_config.label2id,
+        pad_token_id=teacher_config.pad_token_id,
+    )
+
+
+def init_student(teacher: DistilBertForSequenceClassification, config: DistilBertConfig) -> DistilBertForSequenceClassification:
+    """
+    Randomly initialized student whose embeddings start from the teacher's.
+
+    Word and position embeddings are projected onto the top `config.dim`
+    principal directions of the teacher's word embeddings, so the student
+    starts with the teacher's notion of which tokens are alike instead of
+    learning it from a few thousand examples.
+    """
+    student = DistilBertForSequenceClassification(config)
+    teacher_embeddings = teacher.distilbert.embeddings
+    if config.dim > teacher.config.dim:
+        logger.warning("Student is wider than the teacher, leaving its embeddings randomly initialized")
+        return student
+    with torch.no_grad():
+        words = teacher_embeddings.word_embeddings.weight
+        _, _, components = torch.linalg.svd(words - words.mean(0), full_matrices=False)
+        projection = components[:config.dim].T
+        student.distilbert.embeddings.word_embeddings.weight.copy_(words @ projection)
+        student.distilbert.embeddings.position_embeddings.weight.copy_(
+            teacher_embeddings.position_embeddings.weight @ projection
+        )
+    return student
+
+
+def add_teacher_logits(dataset: Dataset, teacher, collator) -> Dataset:
+    """Score the split with the teacher once, instead of on every training step."""
+    logits, _ = predict_logits(teacher, dataset, collator)
+    return dataset.add_column("teacher_logits", logits.tolist())
+
+
+class DistillationTrainer(Trainer):
+    """
+    Trains on a mix of the teacher's temperature-softened outputs and the hard labels.
+
+    The loss is `alpha * T^2 * KL(teacher_T || student_T) + (1 - alpha) * CE`,
+    with teacher logits read from the `teacher_logits` column.
+    """
+
+    def __init__(self, *args, temperature: float = TEMPERATURE, alpha: float = ALPHA, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("teacher_logits")
+        inputs.pop("length", None)
+        outputs = model(**inputs)
+        soft_loss = F.kl_div(
+            F.log_softmax(outputs.logits / self.temperature, dim=-1),
+            F.softmax(teacher_logits / self.temperature, dim=-1),
+            reduction="batchmean",
+        ) * self.temperature ** 2
+        loss = self.alpha * soft_loss + (1 - self.alpha) * outputs.loss
+        return (loss, outputs) if return_outputs else loss
+
+
+def onnx_latency(model_dir: str, vocab_size: int) -> Dict[str, float]:
+    """p50 latency of a quantized export at each of `LATENCY_SHAPES`, single-threaded like the extension."""
+    session = create_session(os.path.join(model_dir, QUANTIZED_MODEL))
+    return {
+        f"{batch_size}x{seq_len}": time_session(session, random_inputs(batch_size, seq_len, vocab_size))["p50_ms"]
+        for batch_size, seq_len in LATENCY_SHAPES
+    }
+
+
+def report(rows: List[Dict]):
+    shapes = [f"{batch_size}x{seq_len}" for batch_size, seq_len in LATENCY_SHAPES]
+    print(f"\n{'model':>8} {'params':>8} {'int8 MB':>8} " + " ".join(f"{'ms@' + s:>10}" for s in shapes) + f" {'F1':>6} {'agree':>6}")
+    for row in rows:
+        print(
+            f"{row['model']:>8} {row['params'] / 1e6:>7.1f}M {row['bytes'] / 2**20:>8.1f} "
+            + " ".join(f"{row['latency_ms'][s]:>10.2f}" for s in shapes)
+            + f" {row['f1']:>6.3f} {row['agreement']:>6.1%}"
+        )
+
+
+def distill(
+    teacher_dir: str = TEACHER_DIR,
+    student_dir: str = STUDENT_DIR,
+    student_onnx_dir: str = STUDENT_ONNX_DIR,
+    teacher_onnx_dir: str = OUTPUT_DIR,
+    layers: int = STUDENT_LAYERS,
+    dim: int = STUDENT_DIM,
+    heads: int = STUDENT_HEADS,
+    temperature: float = TEMPERATURE,
+    alpha: float = ALPHA,
+    epochs: int = 20
+) -> List[Dict]:
+    """
+    Distill the fine-tuned classifier into a small student and export it for the extension.
+
+    The student shares the teacher's tokenizer, so it drops into the same
+    models/<id>/ layout. The best epoch and early stopping are judged on a
+    validation slice of the training split (see `split_validation`); the
+    test split is only used for the final report. Returns (and prints)
+    parameters, quantized ONNX size, latency, test F1 and agreement with
+    the teacher for both models.
+    """
+    if not os.path.isdir(teacher_dir):
+        raise FileNotFoundError(f"{teacher_dir} not found; run train.py first")
+    tokenizer = DistilBertTokenizerFast.from_pretrained(teacher_dir)
+    teacher = DistilBertForSequenceClassification.from_pretrained(teacher_dir)
+    collator = DataCollatorWithPadding(tokenizer=tokenizer)
+
+    tokenized_datasets = load_tokenized_dataset(default_data_path(), tokenizer)
+    tokenized_datasets = {
+        split: add_teacher_logits(dataset, teacher, collator) for split, dataset in tokenized_datasets.items()
+    }
+    train, validation = split_validation(tokenized_datasets["train"])
+
+    student = init_student(teacher, student_config(teacher.config, layers, dim, heads))
+    logger.info(
+        f"Distilling {teacher.num_parameters() / 1e6:.1f}M-parameter teacher into "
+        f"{student.num_parameters() / 1e6:.1f}M-parameter student ({layers} layers, dim {dim}, {heads} heads)"
+    )
+    training_args = TrainingArguments(
+        output_dir="./results_student",
+        learning_rate=5e-4,
+        per_device_train_batch_size=TRAIN_BATCH_SIZE * 2,
+        per_device_eval_batch_size=64,
+        num_train_epochs=epochs,
+        weight_decay=0.01,
+        warmup_ratio=0.1,
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=1,
+        load_best_model_at_end=True,
+        metric_for_best_model="f1",
+        logging_steps=10,
+        group_by_length=True,
+        remove_unused_columns=False,  # keep teacher_logits; compute_loss drops what the model doesn't take
+        report_to="none",
+        use_cpu=True,
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train,
+        eval_dataset=validation,
+        data_collator=collator,
+        compute_metrics=compute_metrics,
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)],
+        temperature=temperature,
+        alpha=alpha,
+    )
+    trainer.train()
+    trainer.save_model(student_dir)
+    tokenizer.save_pretrained(student_dir)
+    logger.info(f"Student saved to {student_dir}")
+
+    # Size, latency and quality of both models on the test split
+    if not os.path.exists(os.path.join(teacher_onnx_dir, QUANTIZED_MODEL)):
+        export(teacher_dir, teacher_onnx_dir)
+    export(student_dir, student_onnx_dir)
+    test = tokenized_datasets["test"]
+    teacher_logits = np.asarray(test["teacher_logits"])
+    rows = []
+    for name, model, onnx_dir in (("teacher", teacher, teacher_onnx_dir), ("student", trainer.model, student_onnx_dir)):
+        logits, labels = predict_logits(model, test, collator)
+        rows.append({
+            "model": name,
+            "params": model.num_parameters(),
+            "bytes": os.path.getsize(os.path.join(onnx_dir, QUANTIZED_MODEL)),
+            "latency_ms": onnx_latency(onnx_dir, model.config.vocab_size),
+            "f1": binary_metrics(logits, labels)["f1"],
+            "agreement": float(np.mean(logits.argmax(-1) == teacher_logits.argmax(-1))),
+        })
+    report(rows)
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Distill the fine-tuned classifier into a small student model")
+    parser.add_argument("--teacher-dir", default=TEACHER_DIR, help="Output of train.py")
+    parser.add_argument("--student-dir", default=STUDENT_DIR)
+    parser.add_argument("--onnx-dir", default=STUDENT_ONNX_DIR, help="Extension model folder for the student")
+    parser.add_argument("--teacher-onnx-dir", default=OUTPUT_DIR, help="Teacher export (created if missing)")
+    parser.add_argument("--layers", type=int, default=STUDENT_LAYERS)
+    parser.add_argument("--dim", type=int, default=STUDENT_DIM)
+    parser.add_argument("--heads", type=int, default=STUDENT_HEADS)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="Weight of the soft-label loss")
+    parser.add_argument("--epochs", type=int, default=20)
+    args = parser.parse_args()
+    distill(
+        teacher_dir=args.teacher_dir,
+        student_dir=args.student_dir,
+        student_onnx_dir=args.onnx_dir,
+        teacher_onnx_dir=args.teacher_onnx_dir,
+        layers=args.layers,
+        dim=args.dim,
+        heads=args.heads,
+        temperature=args.temperature,
+        alpha=args.alpha,
+        epochs=args.epochs
+    )
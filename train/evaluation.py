@@ -0,0 +1,103 @@
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from datasets import Dataset
+from sklearn.metrics import classification_report, confusion_matrix
+from transformers import TrainerCallback
+
+logger = logging.getLogger(__name__)
+
+# Examples scored at each in-training evaluation; the final one uses the whole split
+EVAL_SUBSET_SIZE = 1000
+
+
+def binary_metrics(logits: np.ndarray, labels: np.ndarray) -> Dict[str, float]:
+    """Accuracy, precision, recall and F1 of the positive class, straight from logits."""
+    preds = np.asarray(logits).argmax(-1)
+    labels = np.asarray(labels)
+    tp = float(np.count_nonzero((preds == 1) & (labels == 1)))
+    fp = float(np.count_nonzero((preds == 1) & (labels != 1)))
+    fn = float(np.count_nonzero((preds != 1) & (labels == 1)))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "accuracy": float(np.mean(preds == labels)) if len(labels) else 0.0,
+        "f1": f1,
+        "precision": precision,
+        "recall": recall,
+    }
+
+
+def compute_metrics(pred) -> Dict[str, float]:
+    """Trainer hook: cheap vectorized metrics, no per-evaluation report."""
+    logits = pred.predictions[0] if isinstance(pred.predictions, tuple) else pred.predictions
+    return binary_metrics(logits, pred.label_ids)
+
+
+def sample_eval_subset(dataset: Dataset, size: Optional[int] = EVAL_SUBSET_SIZE, seed: int = 42) -> Dataset:
+    """
+    Stratified sample of `size` examples for in-training evaluation.
+
+    Each label keeps its share of the split. Indices are taken in their
+    original order so a length-sorted split stays length-sorted. Returns the
+    dataset unchanged when `size` is None or not smaller than it.
+    """
+    if not size or size >= len(dataset):
+        return dataset
+    labels = np.asarray(dataset["labels"])
+    rng = np.random.default_rng(seed)
+    picked = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        take = max(1, round(size * len(members) / len(labels)))
+        picked.append(rng.choice(members, size=min(take, len(members)), replace=False))
+    return dataset.select(np.sort(np.concatenate(picked)))
+
+
+def predict_logits(model, dataset: Dataset, collator, batch_size: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+    """Logits and labels for a tokenized split, in the split's order (no Trainer needed)."""
+    model.eval()
+    features = [name for name in ("input_ids", "attention_mask", "labels") if name in dataset.column_names]
+    logits, labels = [], []
+    with torch.no_grad():
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset.select(range(start, min(start + batch_size, len(dataset)))).select_columns(features)
+            batch = collator(rows.to_list())
+            labels.append(batch.pop("labels").numpy())
+            logits.append(model(**batch).logits.float().numpy())
+    return np.concatenate(logits), np.concatenate(labels)
+
+
+def log_detailed_report(logits: np.ndarray, labels: np.ndarray, name: str = "final model"):
+    """Full classification report and confusion matrix, for the final/best checkpoint only."""
+    preds = np.asarray(logits).argmax(-1)
+    report = classification_report(labels, preds, target_names=["genuine", "bait"], zero_division=0)
+    matrix = confusion_matrix(labels, preds, labels=[0, 1])
+    logger.info(f"\nClassification report ({name}, {len(labels)} examples):\n{report}")
+    logger.info(f"Confusion matrix (rows true, columns predicted):\n{matrix}")
+
+
+class EvalTimer(TrainerCallback):
+    """Adds up the wall time the Trainer spends in evaluation."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.evaluations = 0
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if metrics and "eval_runtime" in metrics:
+            self.seconds += metrics["eval_runtime"]
+            self.evaluations += 1
+
+    def log_share(self, total_seconds: float):
+        """Log evaluation time as a share of `total_seconds` (main process only)."""
+        if int(os.environ.get("RANK", 0)) != 0 or total_seconds <= 0:
+            return
+        logger.info(
+            f"Evaluation: {self.evaluations} runs took {self.seconds:.1f}s, "
+            f"{self.seconds / total_seconds:.1%} of {total_seconds:.0f}s total training time"
+        )
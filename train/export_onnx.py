@@ -0,0 +1,456 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from onnxruntime.transformers.optimizer import optimize_model
+from transformers import DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+from train import default_data_path, prepare_dataset
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "./engagement_classifier"
+OUTPUT_DIR = "../chrome-extension/models/engagement-classifier"
+OPSET = 14
+
+# What Transformers.js loads from models/<id>/ (see chrome-extension/worker.js)
+TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "vocab.txt"]
+FP32_MODEL = os.path.join("onnx", "model.onnx")
+FUSED_MODEL = os.path.join("onnx", "model_fused.onnx")
+QUANTIZED_MODEL = os.path.join("onnx", "model_quantized.onnx")
+MODEL_FILES = ["config.json", *TOKENIZER_FILES, FP32_MODEL, QUANTIZED_MODEL]
+
+# The fused graph is an intermediate for quantization and benchmarking. The
+# extension packages everything under models/, so it is kept out of there.
+FUSED_DIR = "./onnx_fused"
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+    "distribution": CalibrationMethod.Distribution,
+}
+CALIBRATION_SIZE = 256
+EVAL_SIZE = 512
+
+# Label names the extension reports (worker.js lowercases `label`)
+ID2LABEL = {0: "safe", 1: "ragebait"}
+
+SAMPLE_TEXTS = [
+    "Why everything you know about productivity is WRONG",
+    "I found these productivity techniques helpful for my workflow",
+    "The shocking truth about morning routines",
+]
+
+
+def graph_path(output_dir: str, name: str) -> str:
+    """Path of graph `name` for the export in `output_dir`; FUSED_MODEL lives under FUSED_DIR/<id>/."""
+    if name == FUSED_MODEL:
+        return os.path.join(FUSED_DIR, os.path.basename(os.path.normpath(output_dir)), name)
+    return os.path.join(output_dir, name)
+
+
+def onnx_inputs(tokenizer, texts: List[str]) -> Dict[str, np.ndarray]:
+    """Padded int64 input_ids / attention_mask, as fed to the exported graph."""
+    encoded = tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="np")
+    return {name: encoded[name].astype(np.int64) for name in ("input_ids", "attention_mask")}
+
+
+def create_session(path: str, threads: Optional[int] = 1) -> ort.InferenceSession:
+    """CPU session; one intra-op thread by default, like the extension's WASM backend."""
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def load_samples(
+    data_path: str,
+    calibration_size: int = CALIBRATION_SIZE,
+    eval_size: int = EVAL_SIZE,
+    seed: int = 42
+) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Random calibration texts and labelled evaluation texts, split like train.py.
+
+    Calibration texts come from the training split; evaluation texts from
+    the test split the model never trained on, so accuracy deltas between
+    graphs are measured on held-out data.
+    """
+    splits = prepare_dataset(data_path)
+    rng = np.random.default_rng(seed)
+    samples = []
+    for split, size in (("train", calibration_size), ("test", eval_size)):
+        dataset = splits[split]
+        picked = dataset.select(np.sort(rng.permutation(len(dataset))[:size]))
+        samples.append([(text, label) for text, label in zip(picked["text"], picked["label"]) if text])
+    calibration, evaluation = samples
+    return [text for text, _ in calibration], [text for text, _ in evaluation], np.array([label for _, label in evaluation])
+
+
+class TextCalibrationReader(CalibrationDataReader):
+    """
+    Feeds tokenized texts to the static quantization calibrator.
+
+    Every batch has the same shape (`batch_size` x `max_length`, trailing
+    texts that don't fill a batch are left out): the histogram-based
+    calibrators stack activations across batches.
+    """
+
+    def __init__(self, tokenizer, texts: List[str], batch_size: int = 16, max_length: int = 128):
+        batch_size = min(batch_size, len(texts))
+        self._batches = (
+            {
+                name: array.astype(np.int64)
+                for name, array in tokenizer(
+                    texts[start:start + batch_size],
+                    padding="max_length",
+                    truncation=True,
+                    max_length=max_length,
+                    return_tensors="np"
+                ).items()
+                if name in ("input_ids", "attention_mask")
+            }
+            for start in range(0, len(texts) - batch_size + 1, batch_size)
+        )
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        return next(self._batches, None)
+
+
+def quantize_static_model(
+    input_path: str,
+    output_path: str,
+    tokenizer,
+    calibration_texts: List[str],
+    method: str = "minmax"
+):
+    """
+    Static INT8 quantization in QDQ format, with activation ranges calibrated on `calibration_texts`.
+
+    Starts from the unfused fp32 graph: onnxruntime's pre-processing
+    (shape inference and graph optimization) runs first, and the
+    quantizer knows how to wrap plain MatMul/Gemm/Add nodes in
+    QuantizeLinear/DequantizeLinear pairs but not the fused contrib ops.
+    Weights are quantized per channel.
+    """
+    preprocessed_path = output_path + ".preprocessed"
+    start = time.perf_counter()
+    try:
+        try:
+            quant_pre_process(input_path, preprocessed_path)
+        except Exception as e:
+            # Symbolic shape inference gives up on some exporter outputs; ONNX's own is enough here
+            logger.warning(f"Symbolic shape inference failed ({e}), pre-processing without it")
+            quant_pre_process(input_path, preprocessed_path, skip_symbolic_shape=True)
+        quantize_static(
+            preprocessed_path,
+            output_path,
+            TextCalibrationReader(tokenizer, calibration_texts),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CALIBRATION_METHODS[method],
+        )
+    finally:
+        if os.path.exists(preprocessed_path):
+            os.remove(preprocessed_path)
+    logger.info(
+        f"Statically quantized {input_path} into {output_path} with {method} calibration "
+        f"on {len(calibration_texts)} texts in {time.perf_counter() - start:.1f}s"
+    )
+
+
+def optimize_graph(input_path: str, output_path: str, config, require_fusion: bool = False) -> Dict[str, int]:
+    """
+    Fuse transformer subgraphs with onnxruntime's transformer optimizer.
+
+    Only the Python fusions run (opt_level=0), so the saved graph has no
+    optimizations specific to this machine baked in and onnxruntime-web
+    still applies its own at load time. Attention and embedding LayerNorm
+    only fuse when the exported graph matches the optimizer's BERT patterns,
+    which the default SDPA attention export does; a shortfall is logged as
+    a warning, or raised with `require_fusion`. Returns the fused operator
+    counts.
+    """
+    optimized = optimize_model(
+        input_path,
+        model_type="bert",  # DistilBERT uses the BERT fusion patterns
+        num_heads=config.n_heads,
+        hidden_size=config.dim,
+        opt_level=0,
+    )
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    optimized.save_model_to_file(output_path)
+    stats = {op: count for op, count in optimized.get_fused_operator_statistics().items() if count}
+    logger.info(f"Fused {input_path} into {output_path}: {stats}")
+
+    expected = {"Attention": config.n_layers, "EmbedLayerNormalization": 1}
+    missing = {op: count for op, count in expected.items() if stats.get(op, 0) < count}
+    if missing:
+        message = "Fusion fell short: " + ", ".join(f"{op} {stats.get(op, 0)}/{count}" for op, count in missing.items())
+        if require_fusion:
+            raise RuntimeError(message)
+        logger.warning(f"{message}; the fused graph will be little faster than fp32")
+    return stats
+
+
+def export_model(
+    model,
+    tokenizer,
+    output_dir: str = OUTPUT_DIR,
+    optimize: bool = True,
+    quantization: Optional[str] = "dynamic",
+    calibration_texts: Optional[List[str]] = None,
+    calibration_method: str = "minmax",
+    require_fusion: bool = False
+) -> Dict[str, int]:
+    """
+    Write `model` and `tokenizer` to `output_dir` in the extension's model layout.
+
+    The graph takes input_ids and attention_mask with dynamic batch and
+    sequence axes and returns logits. `optimize` saves a fused copy under
+    FUSED_DIR, outside the extension (see `optimize_graph` and
+    `graph_path`). `quantization` picks how the INT8 copy the extension
+    loads by default is made: "dynamic" quantizes the weights of the fused
+    graph (or the fp32 one without `optimize`), "static" also quantizes
+    activations, calibrated on `calibration_texts` (see
+    `quantize_static_model`), and None skips it. Returns the size in bytes
+    of every file written.
+    """
+    model = model.cpu().eval()
+    model.config.id2label = dict(ID2LABEL)
+    model.config.label2id = {label: i for i, label in ID2LABEL.items()}
+    os.makedirs(os.path.join(output_dir, "onnx"), exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    # Newer transformers only save tokenizer.json and tokenizer_config.json;
+    # the extension's loader still expects the legacy files next to them
+    special_tokens_path = os.path.join(output_dir, "special_tokens_map.json")
+    if not os.path.exists(special_tokens_path):
+        with open(special_tokens_path, "w") as f:
+            json.dump(tokenizer.special_tokens_map, f, indent=2)
+    vocab_path = os.path.join(output_dir, "vocab.txt")
+    if not os.path.exists(vocab_path):
+        vocab = sorted(tokenizer.get_vocab().items(), key=lambda item: item[1])
+        with open(vocab_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{token}\n" for token, _ in vocab)
+
+    sample = {name: torch.from_numpy(array) for name, array in onnx_inputs(tokenizer, SAMPLE_TEXTS).items()}
+    fp32_path = os.path.join(output_dir, FP32_MODEL)
+    start = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch_size", 1: "sequence_length"},
+                "attention_mask": {0: "batch_size", 1: "sequence_length"},
+                "logits": {0: "batch_size"},
+            },
+            opset_version=OPSET,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    logger.info(f"Exported {fp32_path} in {time.perf_counter() - start:.1f}s")
+
+    stale_fused_path = os.path.join(output_dir, FUSED_MODEL)
+    if os.path.exists(stale_fused_path):
+        # Written there by earlier exports; it would ship with the extension
+        os.remove(stale_fused_path)
+    source_path = fp32_path
+    if optimize:
+        source_path = graph_path(output_dir, FUSED_MODEL)
+        optimize_graph(fp32_path, source_path, model.config, require_fusion)
+    quantized_path = os.path.join(output_dir, QUANTIZED_MODEL)
+    if quantization == "dynamic":
+        quantize_dynamic(
+            source_path,
+            quantized_path,
+            weight_type=QuantType.QInt8,
+            # Shape inference can't type outputs of partially fused subgraphs
+            extra_options={"DefaultTensorType": onnx.TensorProto.FLOAT},
+        )
+    elif quantization == "static":
+        if not calibration_texts:
+            raise ValueError("Static quantization needs calibration texts")
+        quantize_static_model(fp32_path, quantized_path, tokenizer, calibration_texts, calibration_method)
+    elif quantization is not None:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected 'dynamic', 'static' or None")
+
+    expected = MODEL_FILES if quantization else [name for name in MODEL_FILES if name != QUANTIZED_MODEL]
+    missing = [name for name in expected if not os.path.exists(os.path.join(output_dir, name))]
+    if missing:
+        raise RuntimeError(f"Export to {output_dir} is missing {missing}")
+    return {
+        name: os.path.getsize(os.path.join(output_dir, name))
+        for name in expected
+    }
+
+
+def check_export(model, tokenizer, output_dir: str = OUTPUT_DIR, texts: List[str] = SAMPLE_TEXTS):
+    """Run the exported graphs on a padded batch and log their largest logit gap to PyTorch."""
+    inputs = onnx_inputs(tokenizer, texts)
+    with torch.no_grad():
+        expected = model(**{name: torch.from_numpy(array) for name, array in inputs.items()}).logits.numpy()
+    for name in (FP32_MODEL, FUSED_MODEL, QUANTIZED_MODEL):
+        path = graph_path(output_dir, name)
+        if not os.path.exists(path):
+            continue
+        session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        logits = session.run(["logits"], inputs)[0]
+        agreement = np.mean(logits.argmax(-1) == expected.argmax(-1))
+        logger.info(
+            f"{name}: max |logit - PyTorch| {np.max(np.abs(logits - expected)):.2e}, "
+            f"{agreement:.0%} label agreement on {len(texts)} samples"
+        )
+
+
+def evaluate_variants(
+    output_dir: str,
+    tokenizer,
+    texts: List[str],
+    labels: np.ndarray,
+    batch_size: int = 16,
+    threads: Optional[int] = 1
+) -> Dict[str, Dict[str, float]]:
+    """
+    Accuracy and latency of every exported graph on labelled `texts`, relative to fp32.
+
+    Texts are run in length-sorted batches of `batch_size`, as the extension
+    would batch them; latency is the mean wall time per batch.
+    """
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    batches = [
+        onnx_inputs(tokenizer, [texts[i] for i in order[start:start + batch_size]])
+        for start in range(0, len(texts), batch_size)
+    ]
+    labels = np.asarray(labels)[order]
+    results, preds = {}, {}
+    for name in (FP32_MODEL, FUSED_MODEL, QUANTIZED_MODEL):
+        path = graph_path(output_dir, name)
+        if not os.path.exists(path):
+            continue
+        session = create_session(path, threads)
+        session.run(["logits"], batches[0])  # warm up
+        start = time.perf_counter()
+        preds[name] = np.concatenate([session.run(["logits"], batch)[0].argmax(-1) for batch in batches])
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "accuracy": float(np.mean(preds[name] == labels)),
+            "ms_per_batch": elapsed / len(batches) * 1000,
+        }
+
+    fp32 = results.get(FP32_MODEL)
+    if fp32 is None:
+        return results
+    for name, result in results.items():
+        result["accuracy_delta"] = result["accuracy"] - fp32["accuracy"]
+        result["agreement"] = float(np.mean(preds[name] == preds[FP32_MODEL]))
+        result["speedup"] = fp32["ms_per_batch"] / result["ms_per_batch"]
+        logger.info(
+            f"{name}: accuracy {result['accuracy']:.2%} ({result['accuracy_delta']:+.2%} vs fp32), "
+            f"{result['agreement']:.1%} agreement with fp32, {result['ms_per_batch']:.1f}ms per batch of "
+            f"{batch_size} ({result['speedup']:.2f}x)"
+        )
+    return results
+
+
+def export(
+    model_dir: str = MODEL_DIR,
+    output_dir: str = OUTPUT_DIR,
+    optimize: bool = True,
+    quantization: Optional[str] = "dynamic",
+    calibration_method: str = "minmax",
+    data_path: Optional[str] = None,
+    calibration_size: int = CALIBRATION_SIZE,
+    eval_size: int = EVAL_SIZE,
+    require_fusion: bool = False
+) -> Dict[str, int]:
+    """
+    Export the classifier `train()` saved in `model_dir` for the extension.
+
+    When the training data (`data_path`, by default the file dataset.py
+    wrote) exists, a sample of its training split calibrates static
+    quantization and a sample of its test split measures every graph's
+    accuracy and latency against fp32.
+    """
+    if not os.path.isdir(model_dir):
+        raise FileNotFoundError(f"{model_dir} not found; run train.py first")
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    data_path = data_path or default_data_path()
+    calibration_texts = eval_texts = eval_labels = None
+    if os.path.exists(data_path):
+        calibration_texts, eval_texts, eval_labels = load_samples(data_path, calibration_size, eval_size)
+    elif quantization == "static":
+        raise FileNotFoundError(f"Static quantization calibrates on {data_path}, which doesn't exist")
+    sizes = export_model(
+        model,
+        tokenizer,
+        output_dir,
+        optimize=optimize,
+        quantization=quantization,
+        calibration_texts=calibration_texts,
+        calibration_method=calibration_method,
+        require_fusion=require_fusion
+    )
+    check_export(model, tokenizer, output_dir)
+    if eval_texts:
+        evaluate_variants(output_dir, tokenizer, eval_texts, eval_labels)
+    for name, size in sizes.items():
+        logger.info(f"  {name}: {size / 2**20:.1f} MB")
+    logger.info(
+        f"Wrote {output_dir}; set LOCAL_MODEL_ID in chrome-extension/worker.js to "
+        f"'{os.path.basename(os.path.normpath(output_dir))}' to load it"
+    )
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fine-tuned classifier to ONNX for the Chrome extension")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Output of train.py")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Extension model folder (models/<id>)")
+    parser.add_argument("--no-optimize", action="store_true", help=f"Skip transformer graph fusion ({FUSED_DIR}/<id>/onnx/model_fused.onnx)")
+    parser.add_argument("--require-fusion", action="store_true",
+                        help="Fail when attention or embedding LayerNorm doesn't fuse instead of warning")
+    parser.add_argument("--quantization", choices=["dynamic", "static", "none"], default="dynamic",
+                        help="How onnx/model_quantized.onnx is made (static: QDQ with calibrated activations)")
+    parser.add_argument("--calibration-method", choices=list(CALIBRATION_METHODS), default="minmax")
+    parser.add_argument("--data", default=None, help="Training data to calibrate and evaluate on (default: what dataset.py wrote)")
+    parser.add_argument("--calibration-size", type=int, default=CALIBRATION_SIZE, help="Texts used for calibration")
+    parser.add_argument("--eval-size", type=int, default=EVAL_SIZE, help="Held-out texts used to compare the graphs")
+    args = parser.parse_args()
+    export(
+        args.model_dir,
+        args.output_dir,
+        optimize=not args.no_optimize,
+        quantization=None if args.quantization == "none" else args.quantization,
+        calibration_method=args.calibration_method,
+        data_path=args.data,
+        calibration_size=args.calibration_size,
+        eval_size=args.eval_size,
+        require_fusion=args.require_fusion
+    )
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from export_onnx import OUTPUT_DIR, create_session, graph_path, onnx_inputs
+from onnx_benchmark import VARIANTS
+from train import default_data_path, load_table
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Mirrors chrome-extension/worker.js; keep the two in sync
+FALLBACK_THRESHOLD = 0.7
+MAX_CHARS = 512
+PREVIEW_CHARS = 50
+
+RAGE_KEYWORDS = [
+    "outrage", "disgrace", "worst", "idiot", "traitor", "shame", "hate",
+    "destroy", "corrupt", "fraud", "disgusting", "criminal", "liar",
+    "pathetic", "stupid", "angry", "rage", "infuriating", "furious",
+    "boycott", "never again", "cancel", "terrible", "ruined", "disaster"
+]
+
+CLICKBAIT_PHRASES = [
+    "you won't believe", "this is why", "no one is talking about",
+    "what they don't want you to know", "shocking", "unbelievable"
+]
+
+BATCH_SIZES = [1, 8, 32]
+
+
+def heuristic_score(text: Optional[str]) -> float:
+    """Port of worker.js `heuristicScore`: keyword, clickbait, shouting and length cues in [0, 1]."""
+    original = text or ""
+    lower = original.lower()
+
+    score = 0.0
+    keyword_hits = sum(keyword in lower for keyword in RAGE_KEYWORDS)
+    score += min(keyword_hits * 0.08, 0.5)
+
+    clickbait_hits = sum(phrase in lower for phrase in CLICKBAIT_PHRASES)
+    score += min(clickbait_hits * 0.12, 0.36)
+
+    if original.count("!") >= 3:
+        score += 0.1
+
+    uppercase = len(re.findall(r"[A-Z]", original))
+    letters = len(re.findall(r"[A-Za-z]", original)) or 1
+    if letters > 15 and uppercase / letters > 0.35:
+        score += 0.1
+
+    if len(original.strip()) < 30:
+        score *= 0.6
+
+    return max(0.0, min(1.0, score))
+
+
+def heuristic_result(item: Dict, text: str, source: str = "heuristic", error: Optional[str] = None) -> Dict:
+    score = heuristic_score(text)
+    result = {
+        "id": item.get("id"),
+        "text": text[:PREVIEW_CHARS],
+        "label": "ragebait" if score >= FALLBACK_THRESHOLD else "safe",
+        "score": score,
+        "source": source,
+    }
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+class Classifier:
+    """
+    onnxruntime counterpart of the extension's offscreen classifier.
+
+    Loads a models/<id>/ folder written by export_onnx.py. If it can't be
+    loaded (or `model_dir` is None), every item is scored by
+    `heuristic_score` instead, as worker.js does when Transformers.js fails
+    to initialize.
+    """
+
+    def __init__(self, model_dir: Optional[str] = OUTPUT_DIR, variant: str = "quantized", threads: Optional[int] = 1):
+        self.session = None
+        if model_dir is None:
+            self.source = "heuristic"
+            return
+        self.source = "local-" + os.path.basename(os.path.normpath(model_dir))
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+            with open(os.path.join(model_dir, "config.json")) as f:
+                id2label = json.load(f)["id2label"]
+            self.labels = [id2label[str(i)].lower() for i in range(len(id2label))]
+            self.session = create_session(graph_path(model_dir, VARIANTS[variant]), threads)
+            logger.info(f"Loaded {VARIANTS[variant]} from {model_dir}")
+        except Exception as e:
+            logger.error(f"Failed to load {model_dir}, using the heuristic fallback: {e}")
+
+    @property
+    def using_fallback(self) -> bool:
+        return self.session is None
+
+    def classify_batch(self, items: Optional[List[Dict]], batch_size: int = 32) -> List[Dict]:
+        """
+        Classify `items` ({id, text}) into worker.js-shaped results, in input order.
+
+        Texts are cut to 512 characters like the extension, then run as
+        length-sorted padded batches of `batch_size` rather than one at a
+        time. `score` is the softmax probability of the predicted label. A
+        batch that fails to run falls back to the heuristic for its items,
+        with source 'transformer+fallback' and the error attached.
+        """
+        items = items or []
+        texts = [(item.get("text") or "")[:MAX_CHARS] for item in items]
+        if self.using_fallback:
+            return [heuristic_result(item, text) for item, text in zip(items, texts)]
+
+        results: List[Optional[Dict]] = [None] * len(items)
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            try:
+                logits = self.session.run(["logits"], onnx_inputs(self.tokenizer, [texts[i] for i in indices]))[0]
+            except Exception as e:
+                logger.error(f"Error classifying batch of {len(indices)} items: {e}")
+                for i in indices:
+                    results[i] = heuristic_result(items[i], texts[i], "transformer+fallback", str(e))
+                continue
+            probs = np.exp(logits - logits.max(-1, keepdims=True))
+            probs /= probs.sum(-1, keepdims=True)
+            for i, row in zip(indices, probs):
+                top = int(row.argmax())
+                results[i] = {
+                    "id": items[i].get("id"),
+                    "text": texts[i][:PREVIEW_CHARS],
+                    "label": self.labels[top],
+                    "score": float(row[top]),
+                    "source": self.source,
+                }
+        return results
+
+
+_classifiers: Dict[str, Classifier] = {}
+
+
+def classify_batch(items: Optional[List[Dict]], model_dir: str = OUTPUT_DIR, batch_size: int = 32) -> List[Dict]:
+    """`Classifier.classify_batch` on a classifier loaded on first use per `model_dir`, like worker.js `classifyBatch`."""
+    key = os.path.abspath(model_dir)
+    if key not in _classifiers:
+        _classifiers[key] = Classifier(model_dir)
+    return _classifiers[key].classify_batch(items, batch_size)
+
+
+def benchmark(classifier: Classifier, items: List[Dict], batch_sizes: List[int] = BATCH_SIZES, runs: int = 3) -> List[Dict]:
+    """Throughput of `classify_batch` over all of `items` at each batch size (1 is the extension's per-item loop)."""
+    rows = []
+    for batch_size in batch_sizes:
+        classifier.classify_batch(items[:batch_size], batch_size)  # warm up
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results = classifier.classify_batch(items, batch_size)
+            timings.append(time.perf_counter() - start)
+        seconds = float(np.median(timings))
+        rows.append({
+            "batch_size": batch_size,
+            "seconds": seconds,
+            "items_per_sec": len(items) / seconds,
+            "ms_per_item": seconds / len(items) * 1000,
+            "flagged": sum(result["label"] == "ragebait" for result in results),
+        })
+    return rows
+
+
+def print_table(rows: List[Dict], num_items: int, source: str):
+    print(f"\n{num_items} items, {source}")
+    print(f"{'batch':>6} {'items/s':>9} {'ms/item':>8} {'speedup':>8} {'flagged':>8}")
+    for row in rows:
+        print(
+            f"{row['batch_size']:>6} {row['items_per_sec']:>9.1f} {row['ms_per_item']:>8.2f} "
+            f"{rows[0]['seconds'] / row['seconds']:>7.2f}x {row['flagged']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify texts like the extension's worker.js, or benchmark doing so")
+    parser.add_argument("texts", nargs="*", help="Texts to classify; without any, benchmark on --data")
+    parser.add_argument("--model-dir", default=OUTPUT_DIR, help="Folder written by export_onnx.py")
+    parser.add_argument("--variant", choices=list(VARIANTS), default="quantized")
+    parser.add_argument("--heuristic", action="store_true", help="Skip the model and score with the fallback only")
+    parser.add_argument("--data", default=None, help="Training data whose texts are benchmarked (default: what dataset.py wrote)")
+    parser.add_argument("--num-items", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--runs", type=int, default=3, help="Timed passes per batch size")
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads (0 for onnxruntime's default)")
+    parser.add_argument("--json-out", default=None, help="Also write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    classifier = Classifier(None if args.heuristic else args.model_dir, args.variant, args.threads or None)
+    if args.texts:
+        items = [{"id": i, "text": text} for i, text in enumerate(args.texts)]
+        print(json.dumps(classifier.classify_batch(items), indent=2))
+    else:
+        table = load_table(args.data or default_data_path())
+        texts = [text for text in table.select(range(min(args.num_items, len(table))))["text"] if text]
+        items = [{"id": i, "text": text} for i, text in enumerate(texts)]
+        rows = benchmark(classifier, items, args.batch_sizes, args.runs)
+        print_table(rows, len(items), "heuristic" if classifier.using_fallback else classifier.source)
+        if args.json_out:
+            with open(args.json_out, "w") as f:
+                json.dump(rows, f, indent=2)
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from coverage_grid import cell_name, cell_of
+from sink import read_jsonl
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressManifest:
+    """
+    Checkpointed progress of a generation run, stored next to its JSONL output.
+
+    Tracks the target, pairs written, per-topic / per-tactic / per-cell
+    counts, the last completed request id and the run seed (request `i`
+    uses seed `seed + i`).
+    The JSONL file is the source of truth: on resume the counts are rebuilt
+    from it, so a crash between a sink write and a checkpoint loses nothing.
+    """
+
+    def __init__(self, path: str, target: int, seed: int):
+        self.path = path
+        self.target = target
+        self.seed = seed
+        self.written = 0
+        self.last_request_id = -1
+        self.topic_counts: Counter = Counter()
+        self.tactic_counts: Counter = Counter()
+        self.cell_counts: Counter = Counter()  # "topic|tactic" for canonical cells
+        self.started_at = time.time()
+
+    @staticmethod
+    def path_for(jsonl_path: str) -> str:
+        return jsonl_path + ".manifest.json"
+
+    @classmethod
+    def load_or_create(cls, jsonl_path: str, target: int, seed: Optional[int] = None) -> "ProgressManifest":
+        """Resume the manifest for `jsonl_path` if one exists, otherwise start a new one."""
+        path = cls.path_for(jsonl_path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            manifest = cls(path, target, state["seed"] if seed is None else seed)
+            manifest.last_request_id = state.get("last_request_id", -1)
+            manifest.started_at = state.get("started_at", manifest.started_at)
+        else:
+            manifest = cls(path, target, random.randrange(2**31) if seed is None else seed)
+
+        if os.path.exists(jsonl_path):
+            for ex in read_jsonl(jsonl_path):
+                manifest._count(ex)
+        if manifest.written:
+            logger.info(
+                f"Resuming from {path}: {manifest.written}/{target} pairs written, "
+                f"last request id {manifest.last_request_id}"
+            )
+        return manifest
+
+    @property
+    def remaining(self) -> int:
+        return max(self.target - self.written, 0)
+
+    @property
+    def next_request_id(self) -> int:
+        return self.last_request_id + 1
+
+    def request_seed(self, request_id: int) -> int:
+        return self.seed + request_id
+
+    def _count(self, ex: Dict[str, Any]):
+        self.written += 1
+        self.topic_counts[str(ex.get("topic", "unknown"))] += 1
+        self.tactic_counts[str(ex.get("tactic", "unknown"))] += 1
+        cell = cell_of(ex)
+        if cell is not None:
+            self.cell_counts[cell_name(cell)] += 1
+
+    def record(self, request_id: int, batch: List[Dict[str, Any]]):
+        """Account for a batch already written to the sink and checkpoint."""
+        for ex in batch:
+            self._count(ex)
+        self.last_request_id = max(self.last_request_id, request_id)
+        self.save()
+
+    def save(self):
+        state = {
+            "target": self.target,
+            "written": self.written,
+            "seed": self.seed,
+            "last_request_id": self.last_request_id,
+            "topic_counts": dict(self.topic_counts),
+            "tactic_counts": dict(self.tactic_counts),
+            "cell_counts": dict(self.cell_counts),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
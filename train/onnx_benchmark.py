@@ -0,0 +1,112 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import onnxruntime as ort
+
+from export_onnx import FP32_MODEL, FUSED_MODEL, OUTPUT_DIR, QUANTIZED_MODEL, create_session, graph_path
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    "fp32": FP32_MODEL,
+    "fused": FUSED_MODEL,
+    "quantized": QUANTIZED_MODEL,
+}
+BATCH_SIZES = [1, 8, 32]
+SEQUENCE_LENGTHS = [32, 64, 128]
+
+
+def random_inputs(batch_size: int, seq_len: int, vocab_size: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Unpadded random token ids; latency doesn't depend on which tokens they are."""
+    rng = np.random.default_rng(seed)
+    input_ids = rng.integers(0, vocab_size, size=(batch_size, seq_len), dtype=np.int64)
+    return {"input_ids": input_ids, "attention_mask": np.ones_like(input_ids)}
+
+
+def time_session(
+    session: ort.InferenceSession,
+    inputs: Dict[str, np.ndarray],
+    runs: int = 50,
+    warmup: int = 5
+) -> Dict[str, float]:
+    """p50/p95 latency in ms and throughput in sequences/sec for one input shape."""
+    for _ in range(warmup):
+        session.run(None, inputs)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, inputs)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    batch_size = inputs["input_ids"].shape[0]
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "sequences_per_sec": float(batch_size / np.mean(latencies)),
+    }
+
+
+def benchmark(
+    model_dir: str = OUTPUT_DIR,
+    variants: Optional[List[str]] = None,
+    batch_sizes: List[int] = BATCH_SIZES,
+    sequence_lengths: List[int] = SEQUENCE_LENGTHS,
+    runs: int = 50,
+    threads: Optional[int] = 1
+) -> List[Dict]:
+    """Benchmark every variant exported to `model_dir` at every batch size x sequence length."""
+    with open(os.path.join(model_dir, "config.json")) as f:
+        vocab_size = json.load(f)["vocab_size"]
+    results = []
+    for variant in variants or list(VARIANTS):
+        path = graph_path(model_dir, VARIANTS[variant])
+        if not os.path.exists(path):
+            logger.warning(f"Skipping {variant}: {path} not found")
+            continue
+        session = create_session(path, threads)
+        size = os.path.getsize(path)
+        for batch_size in batch_sizes:
+            for seq_len in sequence_lengths:
+                stats = time_session(session, random_inputs(batch_size, seq_len, vocab_size), runs=runs)
+                results.append({"variant": variant, "bytes": size, "batch_size": batch_size, "seq_len": seq_len, **stats})
+                logger.info(f"{variant} batch={batch_size} seq={seq_len}: {stats['p50_ms']:.2f}ms p50")
+    return results
+
+
+def print_table(results: List[Dict]):
+    baseline = {(r["batch_size"], r["seq_len"]): r["p50_ms"] for r in results if r["variant"] == "fp32"}
+    print(f"\n{'variant':>10} {'MB':>6} {'batch':>5} {'seq':>4} {'p50 ms':>8} {'p95 ms':>8} {'seq/sec':>9} {'vs fp32':>8}")
+    for r in results:
+        base = baseline.get((r["batch_size"], r["seq_len"]))
+        speedup = f"{base / r['p50_ms']:.2f}x" if base else "-"
+        print(
+            f"{r['variant']:>10} {r['bytes'] / 2**20:>6.1f} {r['batch_size']:>5} {r['seq_len']:>4} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['sequences_per_sec']:>9.1f} {speedup:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark of the exported ONNX variants")
+    parser.add_argument("--model-dir", default=OUTPUT_DIR, help="Folder written by export_onnx.py")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--seq-lengths", type=int, nargs="+", default=SEQUENCE_LENGTHS)
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per shape")
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads (0 for onnxruntime's default)")
+    parser.add_argument("--json-out", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = benchmark(args.model_dir, args.variants, args.batch_sizes, args.seq_lengths, args.runs, args.threads or None)
+    print_table(results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from transformers import DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+from export_onnx import MODEL_DIR, OUTPUT_DIR, SAMPLE_TEXTS, create_session, graph_path, onnx_inputs
+from onnx_benchmark import VARIANTS
+from train import default_data_path, prepare_dataset
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Largest |logit - PyTorch| and share of flipped labels each variant may show.
+# Unquantized graphs should match to float rounding; int8 gets a budget.
+THRESHOLDS = {
+    "fp32": {"max_logit_delta": 1e-3, "flip_rate": 0.0},
+    "fused": {"max_logit_delta": 1e-3, "flip_rate": 0.0},
+    "quantized": {"max_logit_delta": 0.5, "flip_rate": 0.02},
+}
+NUM_TEXTS = 512
+BATCH_SIZE = 16
+
+# Inputs the CSV is unlikely to cover: empty, emoji-only, and truncated at 512 tokens
+EDGE_TEXTS = [
+    "",
+    "🔥🔥🔥",
+    "THIS IS AN OUTRAGE!!! " * 200,
+]
+
+
+def sample_texts(data_path: str, num_texts: int = NUM_TEXTS, seed: int = 42) -> List[str]:
+    """Up to `num_texts` texts from the test split train.py holds out, or SAMPLE_TEXTS without training data."""
+    if not os.path.exists(data_path):
+        logger.warning(f"{data_path} not found, checking parity on the built-in sample texts only")
+        return list(SAMPLE_TEXTS)
+    test = prepare_dataset(data_path)["test"]
+    picked = np.sort(np.random.default_rng(seed).permutation(len(test))[:num_texts])
+    return test.select(picked)["text"]
+
+
+def make_batches(tokenizer, texts: List[str], batch_size: int = BATCH_SIZE) -> List[Dict[str, np.ndarray]]:
+    """Length-sorted padded batches, so every model sees exactly the same tensors."""
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    return [
+        onnx_inputs(tokenizer, [texts[i] for i in order[start:start + batch_size]])
+        for start in range(0, len(texts), batch_size)
+    ]
+
+
+def run_pytorch(model, batches: List[Dict[str, np.ndarray]]):
+    with torch.no_grad():
+        model(**{name: torch.from_numpy(array) for name, array in batches[0].items()})  # warm up
+        start = time.perf_counter()
+        logits = [
+            model(**{name: torch.from_numpy(array) for name, array in batch.items()}).logits.numpy()
+            for batch in batches
+        ]
+    return np.concatenate(logits), (time.perf_counter() - start) / len(batches) * 1000
+
+
+def run_onnx(path: str, batches: List[Dict[str, np.ndarray]], threads: Optional[int] = 1):
+    session = create_session(path, threads)
+    session.run(["logits"], batches[0])  # warm up
+    start = time.perf_counter()
+    logits = [session.run(["logits"], batch)[0] for batch in batches]
+    return np.concatenate(logits), (time.perf_counter() - start) / len(batches) * 1000
+
+
+def compare(
+    model_dir: str = MODEL_DIR,
+    onnx_dir: str = OUTPUT_DIR,
+    texts: Optional[List[str]] = None,
+    thresholds: Dict[str, Dict[str, float]] = THRESHOLDS,
+    batch_size: int = BATCH_SIZE,
+    threads: Optional[int] = 1
+) -> List[Dict]:
+    """
+    Run `texts` through the PyTorch classifier and every exported ONNX variant.
+
+    Each variant gets its largest logit gap and label flip rate against
+    PyTorch, its mean latency per batch, and `passed` according to
+    `thresholds`. Variants missing from `onnx_dir` are skipped, but the
+    fp32 graph must exist.
+    """
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir).eval()
+    batches = make_batches(tokenizer, texts or SAMPLE_TEXTS, batch_size)
+    expected, pytorch_ms = run_pytorch(model, batches)
+    results = [{"variant": "pytorch", "max_logit_delta": 0.0, "flip_rate": 0.0, "ms_per_batch": pytorch_ms, "passed": True}]
+
+    if not os.path.exists(graph_path(onnx_dir, VARIANTS["fp32"])):
+        raise FileNotFoundError(f"{graph_path(onnx_dir, VARIANTS['fp32'])} not found; run export_onnx.py first")
+    for variant, name in VARIANTS.items():
+        path = graph_path(onnx_dir, name)
+        if not os.path.exists(path):
+            continue
+        logits, ms = run_onnx(path, batches, threads)
+        result = {
+            "variant": variant,
+            "max_logit_delta": float(np.max(np.abs(logits - expected))),
+            "flip_rate": float(np.mean(logits.argmax(-1) != expected.argmax(-1))),
+            "ms_per_batch": ms,
+        }
+        limits = thresholds[variant]
+        result["passed"] = all(result[key] <= limit for key, limit in limits.items())
+        results.append(result)
+    return results
+
+
+def print_table(results: List[Dict], num_texts: int):
+    print(f"\n{num_texts} texts")
+    print(f"{'variant':>10} {'max |dlogit|':>13} {'flips':>7} {'ms/batch':>9} {'speedup':>8} {'':>6}")
+    pytorch_ms = results[0]["ms_per_batch"]
+    for row in results:
+        print(
+            f"{row['variant']:>10} {row['max_logit_delta']:>13.2e} {row['flip_rate']:>7.2%} "
+            f"{row['ms_per_batch']:>9.2f} {pytorch_ms / row['ms_per_batch']:>7.2f}x {'ok' if row['passed'] else 'FAIL':>6}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check exported ONNX graphs against the PyTorch classifier")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Output of train.py")
+    parser.add_argument("--onnx-dir", default=OUTPUT_DIR, help="Folder written by export_onnx.py")
+    parser.add_argument("--data", default=None, help="Training data to sample test-split texts from (default: what dataset.py wrote)")
+    parser.add_argument("--num-texts", type=int, default=NUM_TEXTS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads (0 for onnxruntime's default)")
+    parser.add_argument("--max-delta", type=float, default=THRESHOLDS["fp32"]["max_logit_delta"],
+                        help="Largest logit gap allowed for the fp32 and fused graphs")
+    parser.add_argument("--max-quantized-delta", type=float, default=THRESHOLDS["quantized"]["max_logit_delta"])
+    parser.add_argument("--max-flip-rate", type=float, default=THRESHOLDS["quantized"]["flip_rate"],
+                        help="Share of labels the quantized graph may flip")
+    parser.add_argument("--json-out", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.data or default_data_path(), args.num_texts) + EDGE_TEXTS
+    thresholds = {
+        "fp32": {"max_logit_delta": args.max_delta, "flip_rate": 0.0},
+        "fused": {"max_logit_delta": args.max_delta, "flip_rate": 0.0},
+        "quantized": {"max_logit_delta": args.max_quantized_delta, "flip_rate": args.max_flip_rate},
+    }
+    results = compare(args.model_dir, args.onnx_dir, texts, thresholds, args.batch_size, args.threads or None)
+    print_table(results, len(texts))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [row["variant"] for row in results if not row["passed"]]
+    if failed:
+        logger.error(f"Parity check failed for {', '.join(failed)} (thresholds: {json.dumps(thresholds)})")
+        sys.exit(1)
+    logger.info("All exported variants are within thresholds")
@@ -0,0 +1,103 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("engagement_bait", "genuine_content", "topic")
+OPTIONAL_FIELDS = ("tactic",)
+
+_FENCE = re.compile(r"```(?:json)?")
+
+
+def validate_example(obj: Any) -> Optional[Dict[str, Any]]:
+    """Return the example with only known fields if it matches the schema, else None."""
+    if not isinstance(obj, dict):
+        return None
+    example = {}
+    for field in REQUIRED_FIELDS:
+        value = obj.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        example[field] = value.strip()
+    for field in OPTIONAL_FIELDS:
+        if obj.get(field) is not None:
+            example[field] = obj[field]
+    return example
+
+
+class IncrementalExampleParser:
+    """
+    Salvages complete example objects from a partial or streamed JSON array.
+
+    Text is fed in chunks; every time a top-level `{...}` object completes it
+    is decoded, validated and returned. Keys may come in any order and the
+    surrounding array brackets, commas and markdown fences are ignored, so a
+    response truncated at `max_output_tokens` still yields every object
+    before the cut. `close()` accounts for whatever is left over.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self.salvaged = 0
+        self.dropped = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add `chunk` to the buffer and return the examples it completed."""
+        self._buffer += _FENCE.sub("", chunk)
+        return self._drain(final=False)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Finish the response, skipping past malformed or truncated objects."""
+        examples = self._drain(final=True)
+        self._buffer = ""
+        self._pos = 0
+        return examples
+
+    def _drain(self, final: bool) -> List[Dict[str, Any]]:
+        examples = []
+        while True:
+            start = self._buffer.find("{", self._pos)
+            if start == -1:
+                self._pos = len(self._buffer)
+                break
+            try:
+                obj, end = self._decoder.raw_decode(self._buffer, start)
+            except json.JSONDecodeError:
+                if not final:
+                    # Possibly incomplete; wait for more text
+                    self._pos = start
+                    break
+                # Malformed or truncated: count it and resync on the next object
+                self.dropped += 1
+                self._pos = self._next_object_start(start)
+                continue
+            self._pos = end
+            examples.extend(self._collect(obj))
+        return examples
+
+    def _collect(self, obj: Any) -> List[Dict[str, Any]]:
+        example = validate_example(obj)
+        if example is not None:
+            self.salvaged += 1
+            return [example]
+        # Wrapped responses such as {"examples": [...]}
+        nested = [v for v in obj.values() if isinstance(v, list)] if isinstance(obj, dict) else []
+        if not nested:
+            self.dropped += 1
+            return []
+        return [ex for items in nested for item in items for ex in self._collect(item)]
+
+    def _next_object_start(self, start: int) -> int:
+        """Position of the next object that starts on a new element boundary."""
+        match = re.compile(r"[,\[\n]\s*\{").search(self._buffer, start + 1)
+        return match.end() - 1 if match else len(self._buffer)
+
+
+def parse_examples(text: str, parser: Optional[IncrementalExampleParser] = None) -> List[Dict[str, Any]]:
+    """Parse every valid example out of a complete (possibly truncated) model response."""
+    parser = parser if parser is not None else IncrementalExampleParser()
+    return parser.feed(text) + parser.close()
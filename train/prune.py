@@ -0,0 +1,258 @@
+import argparse
+import logging
+import os
+import shutil
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+from datasets import Dataset
+from sklearn.model_selection import train_test_split
+from transformers import (
+    DataCollatorWithPadding,
+    DistilBertForSequenceClassification,
+    DistilBertTokenizerFast,
+    Trainer,
+    TrainingArguments,
+)
+from transformers.pytorch_utils import prune_linear_layer
+
+from evaluation import binary_metrics, predict_logits
+from export_onnx import QUANTIZED_MODEL, create_session, export, export_model
+from onnx_benchmark import random_inputs, time_session
+from train import TRAIN_BATCH_SIZE, default_data_path, load_tokenized_dataset
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "./engagement_classifier"
+PRUNED_DIR = "./engagement_classifier_pruned"
+PRUNED_ONNX_DIR = "../chrome-extension/models/engagement-classifier-pruned"
+WORK_DIR = "./results_pruning"
+
+VALIDATION_FRACTION = 0.1
+HEADS_PER_STEP = 6  # of DistilBERT's 6 x 12
+FFN_FRACTION_PER_STEP = 0.15  # of the FFN neurons left in every layer
+RECOVERY_STEPS = 200
+MAX_F1_DROP = 0.01
+LATENCY_SHAPE = (1, 64)  # batch size, sequence length
+
+
+def split_validation(train: Dataset, fraction: float = VALIDATION_FRACTION, seed: int = 42) -> Tuple[Dataset, Dataset]:
+    """Stratified (train, validation) split of the tokenized training split."""
+    train_idx, validation_idx = train_test_split(
+        np.arange(len(train)),
+        test_size=fraction,
+        stratify=np.asarray(train["labels"]),
+        random_state=seed
+    )
+    return train.select(np.sort(train_idx)), train.select(np.sort(validation_idx))
+
+
+def _taylor(param: torch.nn.Parameter) -> torch.Tensor:
+    """First-order estimate of the loss change from zeroing each weight: |w * dL/dw|."""
+    return (param.detach() * param.grad).abs()
+
+
+def importance_scores(model, dataset: Dataset, collator, batch_size: int = 32) -> Tuple[List[torch.Tensor], List[torch.Tensor]]:
+    """
+    Per-layer head and FFN neuron importance on `dataset`.
+
+    Scores are summed Taylor saliencies of the weights that belong to each
+    head (its rows of q/k/v and columns of out_lin) or FFN neuron (its row
+    of lin1 and column of lin2), accumulated per batch so gradients of
+    opposite sign across batches don't cancel. Head scores are normalized
+    per layer so heads can be ranked across layers.
+    """
+    layers = model.distilbert.transformer.layer
+    heads = [torch.zeros(layer.attention.n_heads) for layer in layers]
+    neurons = [torch.zeros(layer.ffn.lin1.out_features) for layer in layers]
+    features = ["input_ids", "attention_mask", "labels"]
+    model.eval()  # no dropout noise in the scores
+    for start in range(0, len(dataset), batch_size):
+        rows = dataset.select(range(start, min(start + batch_size, len(dataset)))).select_columns(features)
+        model.zero_grad()
+        model(**collator(rows.to_list())).loss.backward()
+        for i, layer in enumerate(layers):
+            attention, ffn = layer.attention, layer.ffn
+            head_size = attention.dim // attention.n_heads
+            saliency = _taylor(attention.out_lin.weight).sum(0)
+            for lin in (attention.q_lin, attention.k_lin, attention.v_lin):
+                saliency = saliency + _taylor(lin.weight).sum(1) + _taylor(lin.bias)
+            heads[i] += saliency.view(attention.n_heads, head_size).sum(1)
+            neurons[i] += _taylor(ffn.lin1.weight).sum(1) + _taylor(ffn.lin1.bias) + _taylor(ffn.lin2.weight).sum(0)
+    model.zero_grad()
+    heads = [scores / (scores.norm() + 1e-12) for scores in heads]
+    return heads, neurons
+
+
+def prune_step(model, heads: List[torch.Tensor], neurons: List[torch.Tensor], num_heads: int, ffn_fraction: float):
+    """Remove the `num_heads` least important heads (keeping one per layer) and a share of every FFN."""
+    layers = model.distilbert.transformer.layer
+    candidates = []
+    for i, layer in enumerate(layers):
+        # prune_heads takes heads by their original index
+        original = sorted(set(range(model.config.n_heads)) - layer.attention.pruned_heads)
+        candidates.extend((score.item(), i, original[h]) for h, score in enumerate(heads[i]))
+    remaining = {i: layer.attention.n_heads for i, layer in enumerate(layers)}
+    to_prune: Dict[int, List[int]] = {}
+    for _, i, head in sorted(candidates):
+        if sum(len(h) for h in to_prune.values()) >= num_heads:
+            break
+        if remaining[i] > 1:
+            to_prune.setdefault(i, []).append(head)
+            remaining[i] -= 1
+    model.prune_heads(to_prune)
+
+    # Same width in every layer so the pruned model reloads from config.hidden_dim
+    keep = max(1, int(model.config.hidden_dim * (1 - ffn_fraction)))
+    for layer, scores in zip(layers, neurons):
+        index = scores.argsort(descending=True)[:keep].sort().values
+        layer.ffn.lin1 = prune_linear_layer(layer.ffn.lin1, index, dim=0)
+        layer.ffn.lin2 = prune_linear_layer(layer.ffn.lin2, index, dim=1)
+    model.config.hidden_dim = keep
+
+
+def recover(model, train: Dataset, collator, steps: int, output_dir: str):
+    """Short fine-tuning to let the remaining weights absorb what the pruned ones did."""
+    if steps <= 0:
+        return
+    args = TrainingArguments(
+        output_dir=output_dir,
+        learning_rate=3e-5,
+        per_device_train_batch_size=TRAIN_BATCH_SIZE,
+        max_steps=steps,
+        warmup_steps=steps // 10,
+        weight_decay=0.01,
+        save_strategy="no",
+        logging_steps=50,
+        group_by_length=True,
+        report_to="none",
+        use_cpu=True,
+    )
+    Trainer(model=model, args=args, train_dataset=train, data_collator=collator).train()
+
+
+def measure(model, tokenizer, validation: Dataset, test: Dataset, collator, output_dir: str) -> Dict:
+    """Validation and test F1, INT8 ONNX bytes and single-threaded ONNX latency of `model`."""
+    validation_f1 = binary_metrics(*predict_logits(model, validation, collator))["f1"]
+    test_f1 = binary_metrics(*predict_logits(model, test, collator))["f1"]
+    export_model(model, tokenizer, output_dir, optimize=False)
+    path = os.path.join(output_dir, QUANTIZED_MODEL)
+    batch_size, seq_len = LATENCY_SHAPE
+    latency = time_session(create_session(path), random_inputs(batch_size, seq_len, model.config.vocab_size))
+    return {
+        "heads": sum(layer.attention.n_heads for layer in model.distilbert.transformer.layer),
+        "ffn": model.config.hidden_dim,
+        "params": model.num_parameters(),
+        "f1": validation_f1,
+        "test_f1": test_f1,
+        "p50_ms": latency["p50_ms"],
+        "bytes": os.path.getsize(path),
+    }
+
+
+def pareto_front(rows: List[Dict]) -> List[bool]:
+    """Whether each row is not dominated on (validation F1 up, latency down, bytes down)."""
+    def dominates(a, b):
+        no_worse = a["f1"] >= b["f1"] and a["p50_ms"] <= b["p50_ms"] and a["bytes"] <= b["bytes"]
+        better = a["f1"] > b["f1"] or a["p50_ms"] < b["p50_ms"] or a["bytes"] < b["bytes"]
+        return no_worse and better
+    return [not any(dominates(other, row) for other in rows if other is not row) for row in rows]
+
+
+def report(rows: List[Dict], chosen: int):
+    front = pareto_front(rows)
+    batch_size, seq_len = LATENCY_SHAPE
+    print(f"\n{'step':>4} {'heads':>5} {'ffn':>5} {'params':>8} {'val F1':>6} {'test F1':>7} {f'ms@{batch_size}x{seq_len}':>9} {'int8 MB':>8}  pareto")
+    for i, (row, on_front) in enumerate(zip(rows, front)):
+        marker = ("*" if on_front else "") + (" <- chosen" if i == chosen else "")
+        print(
+            f"{i:>4} {row['heads']:>5} {row['ffn']:>5} {row['params'] / 1e6:>7.1f}M {row['f1']:>6.3f} {row['test_f1']:>7.3f} "
+            f"{row['p50_ms']:>9.2f} {row['bytes'] / 2**20:>8.1f}  {marker}"
+        )
+
+
+def prune(
+    model_dir: str = MODEL_DIR,
+    pruned_dir: str = PRUNED_DIR,
+    pruned_onnx_dir: str = PRUNED_ONNX_DIR,
+    steps: int = 5,
+    heads_per_step: int = HEADS_PER_STEP,
+    ffn_fraction: float = FFN_FRACTION_PER_STEP,
+    recovery_steps: int = RECOVERY_STEPS,
+    max_f1_drop: float = MAX_F1_DROP
+) -> List[Dict]:
+    """
+    Iteratively prune heads and FFN neurons of the fine-tuned classifier.
+
+    Each step scores importance on a validation slice of the training split,
+    prunes, fine-tunes briefly on the rest of the training split and
+    measures F1 on the validation slice and the test split along with ONNX
+    size and latency. The fastest step within `max_f1_drop` of the unpruned
+    validation F1 is saved to `pruned_dir` and exported for the extension;
+    test F1 is only reported, so it stays an unbiased estimate for the
+    chosen model. Returns one row per step (step 0 is the unpruned model).
+    """
+    if not os.path.isdir(model_dir):
+        raise FileNotFoundError(f"{model_dir} not found; run train.py first")
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    # Eager attention: the pruned q/k/v widths go through the plain attention path
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir, attn_implementation="eager")
+    collator = DataCollatorWithPadding(tokenizer=tokenizer)
+    tokenized_datasets = load_tokenized_dataset(default_data_path(), tokenizer)
+    train, validation = split_validation(tokenized_datasets["train"])
+    test = tokenized_datasets["test"]
+
+    rows = [measure(model, tokenizer, validation, test, collator, os.path.join(WORK_DIR, "step-0"))]
+    for step in range(1, steps + 1):
+        heads, neurons = importance_scores(model, validation, collator)
+        prune_step(model, heads, neurons, heads_per_step, ffn_fraction)
+        recover(model, train, collator, recovery_steps, os.path.join(WORK_DIR, "trainer"))
+        step_dir = os.path.join(WORK_DIR, f"step-{step}")
+        model.save_pretrained(step_dir)
+        rows.append(measure(model, tokenizer, validation, test, collator, step_dir))
+        logger.info(f"Pruning step {step}: {rows[-1]}")
+
+    eligible = [i for i, row in enumerate(rows) if row["f1"] >= rows[0]["f1"] - max_f1_drop]
+    chosen = min(eligible, key=lambda i: (rows[i]["p50_ms"], rows[i]["bytes"]))
+    report(rows, chosen)
+
+    if chosen == 0:
+        logger.info(f"No pruned model kept validation F1 within {max_f1_drop} of the original; nothing saved")
+        return rows
+    shutil.rmtree(pruned_dir, ignore_errors=True)
+    pruned = DistilBertForSequenceClassification.from_pretrained(
+        os.path.join(WORK_DIR, f"step-{chosen}"), attn_implementation="eager"
+    )
+    pruned.save_pretrained(pruned_dir)
+    tokenizer.save_pretrained(pruned_dir)
+    logger.info(
+        f"Saved step {chosen} to {pruned_dir}: validation F1 {rows[chosen]['f1']:.3f}, "
+        f"test F1 {rows[chosen]['test_f1']:.3f} (unpruned {rows[0]['test_f1']:.3f})"
+    )
+    export(pruned_dir, pruned_onnx_dir, optimize=False)
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Structured pruning of attention heads and FFN neurons")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Output of train.py")
+    parser.add_argument("--pruned-dir", default=PRUNED_DIR)
+    parser.add_argument("--onnx-dir", default=PRUNED_ONNX_DIR, help="Extension model folder for the pruned model")
+    parser.add_argument("--steps", type=int, default=5, help="Prune / recover iterations")
+    parser.add_argument("--heads-per-step", type=int, default=HEADS_PER_STEP)
+    parser.add_argument("--ffn-fraction", type=float, default=FFN_FRACTION_PER_STEP, help="Share of FFN neurons removed per step")
+    parser.add_argument("--recovery-steps", type=int, default=RECOVERY_STEPS, help="Fine-tuning steps after each pruning step")
+    parser.add_argument("--max-f1-drop", type=float, default=MAX_F1_DROP, help="Largest validation F1 loss the chosen model may have")
+    args = parser.parse_args()
+    prune(
+        model_dir=args.model_dir,
+        pruned_dir=args.pruned_dir,
+        pruned_onnx_dir=args.onnx_dir,
+        steps=args.steps,
+        heads_per_step=args.heads_per_step,
+        ffn_fraction=args.ffn_fraction,
+        recovery_steps=args.recovery_steps,
+        max_f1_drop=args.max_f1_drop
+    )
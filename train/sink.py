@@ -0,0 +1,169 @@
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Rows buffered in memory while compacting
+COMPACT_CHUNK_SIZE = 10_000
+
+
+class ListSink:
+    """In-memory sink, for small runs that want the examples back directly."""
+
+    def __init__(self):
+        self.examples: List[Dict[str, Any]] = []
+
+    def write(self, examples: List[Dict[str, Any]]):
+        self.examples.extend(examples)
+
+    def close(self):
+        pass
+
+
+def _truncate_torn_tail(path: str):
+    """Drop a partially written last line left behind by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back in blocks to the last complete line
+        pos = end
+        while pos > 0:
+            start = max(pos - 65536, 0)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline != -1:
+                pos = start + newline + 1
+                break
+            pos = start
+        f.truncate(pos)
+        logger.warning(f"Truncated partial trailing record in {path}")
+
+
+class JsonlSink:
+    """
+    Append-only JSONL sink for generated pairs.
+
+    Every batch is flushed as it is written, and the file is fsynced every
+    `fsync_every` records or `fsync_interval` seconds, whichever comes first,
+    so a crash loses at most the unsynced tail.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 100, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        _truncate_torn_tail(path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.records_written = 0
+
+    def write(self, examples: List[Dict[str, Any]]):
+        for ex in examples:
+            self._file.write(json.dumps(ex, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += len(examples)
+        self.records_written += len(examples)
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield records from a JSONL file, skipping a torn final line."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed line {line_no} in {path}")
+
+
+def iter_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Flatten stored pairs into labelled text rows.
+
+    Both texts of a pair share a `group` (the dedup group if the pairs went
+    through `dedup.py`, otherwise the pair index) so the split keeps them together.
+    """
+    for pair_idx, ex in enumerate(read_jsonl(path)):
+        group = ex.get("group", pair_idx)
+        yield {"text": ex["engagement_bait"], "label": 1, "group": group}
+        yield {"text": ex["genuine_content"], "label": 0, "group": group}
+
+
+def _chunks(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def compact(jsonl_path: str, output_path: str, chunk_size: int = COMPACT_CHUNK_SIZE) -> int:
+    """
+    Compact a JSONL pair file into the CSV, Parquet or Arrow file `prepare_dataset` reads.
+
+    The format is picked from the output extension (.csv, .parquet or .arrow). Rows are streamed in
+    chunks so memory stays bounded. Returns the number of rows written.
+    """
+    tmp_path = output_path + ".tmp"
+    rows_written = 0
+
+    if output_path.endswith((".parquet", ".arrow")):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([("text", pa.string()), ("label", pa.int64()), ("group", pa.int64())])
+        if output_path.endswith(".parquet"):
+            writer = pq.ParquetWriter(tmp_path, schema)
+        else:
+            # Arrow IPC stream, the format `datasets.Dataset.from_file` memory-maps
+            writer = pa.ipc.new_stream(tmp_path, schema)
+        with writer:
+            for chunk in _chunks(iter_rows(jsonl_path), chunk_size):
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                rows_written += len(chunk)
+    else:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["text", "label", "group"])
+            writer.writeheader()
+            for chunk in _chunks(iter_rows(jsonl_path), chunk_size):
+                writer.writerows(chunk)
+                rows_written += len(chunk)
+
+    os.replace(tmp_path, output_path)
+    logger.info(f"Compacted {jsonl_path} into {output_path} ({rows_written} rows)")
+    return rows_written
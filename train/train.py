@@ -1,31 +1,55 @@
-from datasets import Dataset
+from datasets import Dataset, load_from_disk
+import transformers
 from transformers import (
-    DistilBertTokenizer,
+    DistilBertTokenizerFast,
     DistilBertForSequenceClassification,
     DistilBertConfig,
-    Trainer,
+    DataCollatorWithPadding,
     TrainingArguments,
     EarlyStoppingCallback
 )
+from transformers.trainer_pt_utils import LengthGroupedSampler
 import pandas as pd
 import numpy as np
 import torch
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support, classification_report
+from sklearn.model_selection import StratifiedGroupKFold, train_test_split
+from checkpoints import CheckpointManager, CheckpointingTrainer
+from cpu_perf import cpu_perf_settings
+from evaluation import EVAL_SUBSET_SIZE, EvalTimer, compute_metrics, log_detailed_report, sample_eval_subset
+import argparse
+import hashlib
+import json
 import logging
-from typing import Dict, Any
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('training.log')
-    ]
-)
+import os
+import shutil
+import time
+from typing import Dict, Any, List, Optional
+
 logger = logging.getLogger(__name__)
 
+MAX_LENGTH = 128
+TOKENIZATION_VERSION = 1  # bump when tokenize_splits changes
+TOKENIZED_CACHE_DIR = "./tokenized_cache"
+MULTIPROC_MIN_EXAMPLES = 20_000
+MAX_TOKENIZE_PROCS = 16
+TRAIN_BATCH_SIZE = 16
+EVAL_STEPS = 50
+KEEP_CHECKPOINTS = 2
+
+# Training data written by dataset.py, in order of preference
+DATA_FILES = [
+    "outrage_training_data.arrow",
+    "outrage_training_data.parquet",
+    "outrage_training_data.csv",
+]
+
+def default_data_path() -> str:
+    """The first training data file dataset.py wrote, preferring columnar formats."""
+    return next(
+        (path for path in DATA_FILES if os.path.exists(path)),
+        DATA_FILES[-1]
+    )
+
 def set_device() -> torch.device:
     """Set up the appropriate device for training."""
     # Force CPU usage regardless of available hardware
@@ -33,80 +57,287 @@ def set_device() -> torch.device:
     logger.info("Using CPU")
     return device
 
-def compute_metrics(pred) -> Dict[str, float]:
+def is_main_process() -> bool:
+    """True outside distributed runs and on global rank 0 inside them."""
+    return int(os.environ.get("RANK", 0)) == 0
+
+def padding_efficiency(
+    lengths: List[int],
+    batch_size: int,
+    grouped: bool = True,
+    group_size: Optional[int] = None
+) -> float:
     """
-    Compute evaluation metrics for the model.
+    Fraction of token positions in the padded batches that are real tokens.
+
+    With `grouped`, the order comes from a length-grouped sampler like the
+    Trainer's, which groups by `group_size` (the Trainer passes its train
+    batch size times gradient accumulation steps; defaults to `batch_size`),
+    and batches of `batch_size` are padded to their longest member;
+    otherwise every sequence is padded to `MAX_LENGTH`.
     """
-    labels = pred.label_ids
-    preds = pred.predictions.argmax(-1)
-    
-    # Calculate metrics
-    precision, recall, f1, _ = precision_recall_fscore_support(
-        labels, 
-        preds, 
-        average='binary',
-        zero_division=0
+    if not grouped:
+        return float(np.sum(lengths)) / (len(lengths) * MAX_LENGTH)
+    sampler = LengthGroupedSampler(
+        group_size or batch_size, lengths=lengths, generator=torch.Generator().manual_seed(42)
     )
-    acc = accuracy_score(labels, preds)
-    
-    # Get detailed classification report
-    report = classification_report(labels, preds)
-    logger.info(f"\nClassification Report:\n{report}")
-    
-    return {
-        'accuracy': acc,
-        'f1': f1,
-        'precision': precision,
-        'recall': recall
-    }
+    order = list(sampler)
+    padded = sum(
+        max(lengths[i] for i in order[start:start + batch_size]) * len(order[start:start + batch_size])
+        for start in range(0, len(order), batch_size)
+    )
+    return float(np.sum(lengths)) / padded
+
+def load_table(file_path: str) -> Dataset:
+    """
+    Load a CSV, Parquet or Arrow file into a memory-mapped `datasets.Dataset`.
+
+    Arrow files are memory-mapped as they are; CSV and Parquet are converted
+    once into an Arrow cache file by `datasets` and memory-mapped from there.
+    None of these go through pandas.
+    """
+    if file_path.endswith(".arrow"):
+        return Dataset.from_file(file_path)
+    if file_path.endswith(".parquet"):
+        return Dataset.from_parquet(file_path)
+    return Dataset.from_csv(file_path)
 
 def prepare_dataset(file_path: str):
     """
     Load and prepare the dataset with stratified split.
+
+    If the data has a `group` column (written by dataset.py), whole groups go
+    to one side of the split. That keeps related pairs together on a best
+    effort basis only: dedup.py drops pairs at or above its
+    `duplicate_threshold`, but a pair in the band below it joins just its
+    single best match and never a full group, so its other matches can land
+    on the other side. The group split is one fold of a 5-fold
+    StratifiedGroupKFold, so the test share is only near 20% with many
+    groups; with 5-6 groups it is a whole group or two (often 25% or more),
+    and fewer than 5 groups raise a ValueError.
+    The split is computed on the label/group columns only and applied as
+    index selections over the memory-mapped table, so no rows are copied.
     """
     try:
-        df = pd.read_csv(file_path)
-        logger.info(f"Loaded dataset with {len(df)} examples")
-        
-        # Check class balance
-        class_dist = df['label'].value_counts(normalize=True)
-        logger.info(f"Class distribution:\n{class_dist}")
-        
-        # Perform stratified split using sklearn
-        train_df, test_df = train_test_split(
-            df,
-            test_size=0.2,
-            stratify=df['label'],
-            random_state=42
-        )
+        dataset = load_table(file_path)
+        logger.info(f"Loaded dataset with {len(dataset)} examples")
         
         # Ensure 'text' and 'label' columns exist
         required_columns = ['text', 'label']
-        if not all(col in df.columns for col in required_columns):
+        if not all(col in dataset.column_names for col in required_columns):
             raise ValueError(f"Dataset must contain columns: {required_columns}")
         
-        # Convert to HuggingFace Datasets
-        train_dataset = Dataset.from_pandas(train_df.reset_index(drop=True))
-        test_dataset = Dataset.from_pandas(test_df.reset_index(drop=True))
+        # Check class balance
+        labels = dataset.data.column('label').to_numpy()
+        class_dist = pd.Series(labels).value_counts(normalize=True)
+        logger.info(f"Class distribution:\n{class_dist}")
+        
+        groups = None
+        if 'group' in dataset.column_names:
+            groups = dataset.data.column('group').to_numpy()
+            dataset = dataset.remove_columns(['group'])
+            num_groups = len(np.unique(groups))
+            if num_groups < 5:
+                raise ValueError(
+                    f"Only {num_groups} near-duplicate groups, too few for a 5-fold group split; "
+                    "generate more varied data, or rerun dataset.py with --no-dedup to split without groups"
+                )
+        
+        # Perform stratified split using sklearn
+        indices = np.arange(len(dataset))
+        if groups is not None:
+            splitter = StratifiedGroupKFold(n_splits=5, shuffle=True, random_state=42)
+            train_idx, test_idx = next(splitter.split(indices, labels, groups=groups))
+        else:
+            train_idx, test_idx = train_test_split(
+                indices,
+                test_size=0.2,
+                stratify=labels,
+                random_state=42
+            )
+        logger.info(f"Split: {len(train_idx)} train / {len(test_idx)} test ({len(test_idx) / len(indices):.1%} test)")
         
         return {
-            "train": train_dataset,
-            "test": test_dataset
+            "train": dataset.select(train_idx),
+            "test": dataset.select(test_idx)
         }
     except Exception as e:
         logger.error(f"Error loading dataset: {e}")
         raise
 
-def train():
+def default_num_proc(num_examples: int) -> int:
+    """Worker processes for tokenization: all cores for large corpora, one for small ones."""
+    if num_examples < MULTIPROC_MIN_EXAMPLES:
+        return 1
+    return min(os.cpu_count() or 1, MAX_TOKENIZE_PROCS)
+
+def tokenize_splits(dataset_dict: Dict[str, Dataset], tokenizer, num_proc: Optional[int] = None) -> Dict[str, Dataset]:
+    """
+    Tokenize every split; padding happens per batch in the collator.
+
+    Splits are mapped across `num_proc` worker processes (auto-sized from the
+    corpus when None) and the overall throughput is logged.
+    """
+    def tokenize_function(examples):
+        """Tokenize while keeping the labels"""
+        tokenized = tokenizer(
+            examples["text"],
+            truncation=True,
+            max_length=MAX_LENGTH
+        )
+        # Make sure to return the labels along with the tokenized inputs
+        tokenized["labels"] = examples["label"]
+        # Used by the length-grouped sampler
+        tokenized["length"] = [len(ids) for ids in tokenized["input_ids"]]
+        return tokenized
+    
+    num_examples = sum(len(dataset) for dataset in dataset_dict.values())
+    num_proc = num_proc or default_num_proc(num_examples)
+    if num_proc > 1:
+        # The Rust tokenizer's own thread pool doesn't survive forking into map workers
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    
+    # Apply tokenization
+    start = time.perf_counter()
+    tokenized_datasets = {
+        split: dataset.map(
+            tokenize_function,
+            batched=True,
+            num_proc=num_proc if num_proc > 1 else None,
+            remove_columns=dataset.column_names
+        )
+        for split, dataset in dataset_dict.items()
+    }
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Tokenized {num_examples} examples in {elapsed:.2f}s with {num_proc} process(es) "
+        f"({num_examples / elapsed:.0f} examples/sec, {type(tokenizer).__name__})"
+    )
+    # Order eval batches by length so they pad to similar sizes too
+    tokenized_datasets["test"] = tokenized_datasets["test"].sort("length")
+    return tokenized_datasets
+
+def file_fingerprint(file_path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def tokenization_cache_key(data_path: str, tokenizer) -> str:
+    """Key tokenized splits on the data contents, the tokenizer and the tokenization settings."""
+    payload = json.dumps({
+        "data": file_fingerprint(data_path),
+        "tokenizer": tokenizer.name_or_path,
+        "tokenizer_class": type(tokenizer).__name__,
+        "vocab_size": len(tokenizer),
+        "transformers": transformers.__version__,
+        "max_length": MAX_LENGTH,
+        "version": TOKENIZATION_VERSION,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def load_tokenized_dataset(
+    data_path: str,
+    tokenizer,
+    cache_dir: str = TOKENIZED_CACHE_DIR,
+    num_proc: Optional[int] = None
+) -> Dict[str, Dataset]:
+    """
+    Split and tokenize `data_path`, reusing splits saved by an earlier run.
+
+    Tokenized splits are saved under `cache_dir/<key>` and reloaded
+    memory-mapped with `load_from_disk`, so runs over the same data and
+    tokenizer (e.g. hyperparameter sweeps) skip splitting and tokenization.
+    """
+    cache_path = os.path.join(cache_dir, tokenization_cache_key(data_path, tokenizer))
+    if os.path.isdir(cache_path):
+        logger.info(f"Loading tokenized splits from {cache_path}")
+        return {split: load_from_disk(os.path.join(cache_path, split)) for split in ("train", "test")}
+
+    tokenized_datasets = tokenize_splits(prepare_dataset(data_path), tokenizer, num_proc=num_proc)
+    tmp_path = cache_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    for split, dataset in tokenized_datasets.items():
+        dataset.save_to_disk(os.path.join(tmp_path, split))
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Saved tokenized splits to {cache_path}")
+    return {split: load_from_disk(os.path.join(cache_path, split)) for split in ("train", "test")}
+
+def train(
+    num_proc: Optional[int] = None,
+    profile: str = "default",
+    benchmark_steps: Optional[int] = None,
+    eval_steps: int = EVAL_STEPS,
+    eval_subset_size: Optional[int] = EVAL_SUBSET_SIZE,
+    keep_checkpoints: int = KEEP_CHECKPOINTS,
+    resume_from_checkpoint: Optional[Any] = None
+):
+    """
+    Fine-tune DistilBERT on the generated data and save it to ./engagement_classifier.
+
+    `profile="cpu-perf"` tunes torch threading, bf16 autocast and dataloader
+    workers for the host CPU (see cpu_perf.py). Launched under torchrun, the
+    Trainer runs distributed data parallel over gloo: each process trains on
+    its shard of the data and evaluation predictions are gathered from all
+    processes before `compute_metrics`. With `benchmark_steps`, training
+    stops after that many steps without evaluating or saving, and the
+    throughput metrics are returned (used by ddp_benchmark.py).
+
+    Evaluations during training score a stratified sample of
+    `eval_subset_size` test examples (None for the whole split) every
+    `eval_steps` steps with vectorized metrics only; the full test split and
+    the detailed classification report are reserved for the best checkpoint
+    at the end. Checkpoints are written in the background as safetensors
+    and only the `keep_checkpoints` best by F1 are kept, plus the latest,
+    with the optimizer, scheduler and RNG state needed to continue from
+    them: `resume_from_checkpoint` takes a checkpoint folder, or True for the
+    latest one in ./results (see checkpoints.py).
+    """
     # Set device
     device = set_device()
+    training_overrides = cpu_perf_settings() if profile == "cpu-perf" else {}
     
     try:
-        # Load and prepare dataset
-        dataset_dict = prepare_dataset("outrage_training_data.csv")
+        # Training arguments (created first: under torchrun this sets up the process group)
+        training_args = TrainingArguments(
+            output_dir="./results",
+            learning_rate=2e-5,
+            per_device_train_batch_size=TRAIN_BATCH_SIZE,
+            per_device_eval_batch_size=16,
+            num_train_epochs=10,
+            max_steps=benchmark_steps or -1,
+            weight_decay=0.01,
+            evaluation_strategy="no" if benchmark_steps else "steps",
+            eval_steps=eval_steps,
+            save_strategy="no" if benchmark_steps else "steps",
+            save_steps=eval_steps,
+            load_best_model_at_end=not benchmark_steps,
+            metric_for_best_model="f1",
+            logging_dir='./logs',
+            logging_steps=10,
+            warmup_steps=500,
+            fp16=False,
+            gradient_accumulation_steps=2,
+            group_by_length=True,
+            # gloo for CPU-only process groups under torchrun; a plain run has no process group
+            ddp_backend="gloo" if int(os.environ.get("WORLD_SIZE", 1)) > 1 else None,
+            ddp_find_unused_parameters=False,
+            report_to="none",
+            use_cpu=True,  # Force CPU usage
+            use_mps_device=False,  # Explicitly disable MPS
+            **training_overrides
+        )
         
         # Load tokenizer
-        tokenizer = DistilBertTokenizer.from_pretrained('distilbert-base-uncased')
+        tokenizer = DistilBertTokenizerFast.from_pretrained('distilbert-base-uncased')
+        
+        # Load and tokenize dataset (prefer the columnar file if dataset.py wrote one).
+        # In distributed runs rank 0 tokenizes and fills the cache, the others then load it.
+        data_path = default_data_path()
+        with training_args.main_process_first(desc="tokenization"):
+            tokenized_datasets = load_tokenized_dataset(data_path, tokenizer, num_proc=num_proc)
         
         # Load config and update dropout settings
         config = DistilBertConfig.from_pretrained(
@@ -120,72 +351,67 @@ def train():
             config=config
         ).to(device)
         
-        def tokenize_function(examples):
-            """Tokenize while keeping the labels"""
-            tokenized = tokenizer(
-                examples["text"],
-                padding="max_length",
-                truncation=True,
-                max_length=128
-            )
-            # Make sure to return the labels along with the tokenized inputs
-            tokenized["labels"] = examples["label"]
-            return tokenized
-        
-        # Apply tokenization
-        tokenized_datasets = {
-            split: dataset.map(
-                tokenize_function,
-                batched=True,
-                remove_columns=dataset.column_names
-            )
-            for split, dataset in dataset_dict.items()
-        }
+        train_lengths = tokenized_datasets["train"]["length"]
+        batch_size = training_args.per_device_train_batch_size
+        group_size = training_args.train_batch_size * training_args.gradient_accumulation_steps
+        logger.info(
+            f"Padding efficiency: {padding_efficiency(train_lengths, batch_size, group_size=group_size):.1%} "
+            f"with length-grouped dynamic padding vs "
+            f"{padding_efficiency(train_lengths, batch_size, grouped=False):.1%} "
+            f"at max_length={MAX_LENGTH}"
+        )
         
-        # Training arguments
-        training_args = TrainingArguments(
-            output_dir="./results",
-            learning_rate=2e-5,
-            per_device_train_batch_size=16,
-            per_device_eval_batch_size=16,
-            num_train_epochs=10,
-            weight_decay=0.01,
-            evaluation_strategy="steps",
-            eval_steps=50,
-            save_strategy="steps",
-            save_steps=50,
-            load_best_model_at_end=True,
-            metric_for_best_model="f1",
-            logging_dir='./logs',
-            logging_steps=10,
-            warmup_steps=500,
-            fp16=False,
-            gradient_accumulation_steps=2,
-            report_to="none",
-            use_cpu=True,  # Force CPU usage
-            use_mps_device=False  # Explicitly disable MPS
+        eval_subset = sample_eval_subset(tokenized_datasets["test"], eval_subset_size)
+        if len(eval_subset) < len(tokenized_datasets["test"]):
+            logger.info(
+                f"Evaluating on {len(eval_subset)}/{len(tokenized_datasets['test'])} test examples "
+                f"every {eval_steps} steps, full split at the end"
+            )
+        eval_timer = EvalTimer()
+        checkpoints = CheckpointManager(
+            training_args.output_dir,
+            metric=training_args.metric_for_best_model,
+            greater_is_better=training_args.greater_is_better,
+            keep=keep_checkpoints
         )
         
         # Initialize trainer with early stopping
-        trainer = Trainer(
+        trainer = CheckpointingTrainer(
             model=model,
             args=training_args,
             train_dataset=tokenized_datasets["train"],
-            eval_dataset=tokenized_datasets["test"],
+            eval_dataset=eval_subset,
+            data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
             compute_metrics=compute_metrics,
-            callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+            checkpoints=checkpoints,
+            callbacks=[eval_timer] if benchmark_steps else [eval_timer, EarlyStoppingCallback(early_stopping_patience=3)]
         )
         
         # Train and evaluate
-        trainer.train()
+        train_result = trainer.train(resume_from_checkpoint=resume_from_checkpoint)
+        logger.info(
+            f"Training throughput: {train_result.metrics['train_samples_per_second']:.1f} samples/sec "
+            f"across {training_args.world_size} process(es) "
+            f"({train_result.metrics['train_runtime']:.0f}s total)"
+        )
+        if benchmark_steps:
+            return train_result.metrics
         
-        # Final evaluation
-        final_metrics = trainer.evaluate()
+        # Final evaluation of the best checkpoint on the full test split
+        final = trainer.predict(tokenized_datasets["test"], metric_key_prefix="eval")
+        final_metrics = final.metrics
         logger.info(f"Final evaluation metrics: {final_metrics}")
+        eval_timer.seconds += final_metrics["eval_runtime"]
+        eval_timer.evaluations += 1
+        eval_timer.log_share(train_result.metrics["train_runtime"] + final_metrics["eval_runtime"])
+        if trainer.is_world_process_zero():
+            log_detailed_report(final.predictions, final.label_ids, name="best checkpoint")
         
-        # Save model
+        # Save model (Trainer.save_model only writes from the main process)
         model_save_path = "./engagement_classifier"
         trainer.save_model(model_save_path)
+        if not trainer.is_world_process_zero():
+            return final_metrics
         tokenizer.save_pretrained(model_save_path)
         logger.info(f"Model and tokenizer saved to {model_save_path}")
         
@@ -208,10 +434,44 @@ def train():
         for text, pred in zip(test_texts, predictions):
             logger.info(f"Text: {text}")
             logger.info(f"Prediction: {'Engagement Bait' if pred == 1 else 'Genuine Content'}\n")
+        
+        return final_metrics
             
     except Exception as e:
         logger.error(f"Training failed with error: {e}")
         raise
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    # Set up logging here rather than at import, so scripts importing this
+    # module don't append to training.log
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('training.log')
+        ]
+    )
+    parser = argparse.ArgumentParser(description="Fine-tune DistilBERT on the generated engagement bait data")
+    parser.add_argument("--num-proc", type=int, default=None, help="Tokenization worker processes (default: auto)")
+    parser.add_argument("--profile", choices=["default", "cpu-perf"], default="default", help="Training performance profile")
+    parser.add_argument("--benchmark-steps", type=int, default=None, help="Train this many steps only and report throughput")
+    parser.add_argument("--eval-steps", type=int, default=EVAL_STEPS, help="Steps between evaluations (and checkpoints)")
+    parser.add_argument("--eval-subset", type=int, default=EVAL_SUBSET_SIZE, help="Test examples scored per in-training evaluation (0 for all)")
+    parser.add_argument("--keep-checkpoints", type=int, default=KEEP_CHECKPOINTS, help="Best checkpoints kept in ./results")
+    parser.add_argument("--resume-from-checkpoint", nargs="?", const=True, default=None,
+                        help="Continue from a checkpoint folder (the latest in ./results without a value)")
+    parser.add_argument("--metrics-out", default=None, help="Write the returned metrics as JSON (main process only)")
+    args = parser.parse_args()
+    metrics = train(
+        num_proc=args.num_proc,
+        profile=args.profile,
+        benchmark_steps=args.benchmark_steps,
+        eval_steps=args.eval_steps,
+        eval_subset_size=args.eval_subset or None,
+        keep_checkpoints=args.keep_checkpoints,
+        resume_from_checkpoint=args.resume_from_checkpoint
+    )
+    if args.metrics_out and is_main_process():
+        with open(args.metrics_out, "w") as f:
+            json.dump(metrics, f, indent=2)
\ No newline at end of file
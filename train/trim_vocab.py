@@ -0,0 +1,207 @@
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from tokenizers import Tokenizer
+from transformers import DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+from export_onnx import OUTPUT_DIR, QUANTIZED_MODEL, create_session, export
+from train import MAX_LENGTH, default_data_path, load_table, prepare_dataset
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "./engagement_classifier"
+TRIMMED_DIR = "./engagement_classifier_trimmed"
+TRIMMED_ONNX_DIR = "../chrome-extension/models/engagement-classifier-trimmed"
+MIN_COUNT = 1
+PARITY_SAMPLE = 2000
+TWEET_HOLDOUT = 0.1  # share of the tweets kept out of the counts for the parity check
+
+
+def read_texts(path: str) -> List[str]:
+    """Texts from a .txt file (one per line) or the `text` column of a CSV/Parquet/Arrow file."""
+    if path.endswith(".txt"):
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [text for text in load_table(path)["text"] if text]
+
+
+def token_counts(tokenizer, texts: List[str], batch_size: int = 1000) -> Counter:
+    counts: Counter = Counter()
+    for start in range(0, len(texts), batch_size):
+        for ids in tokenizer(texts[start:start + batch_size], truncation=True, max_length=MAX_LENGTH)["input_ids"]:
+            counts.update(ids)
+    return counts
+
+
+def select_vocab(tokenizer, counts: Counter, min_count: int = MIN_COUNT, max_size: Optional[int] = None) -> List[int]:
+    """
+    Old token ids to keep, in their original order.
+
+    Special tokens and every single character (with and without the `##`
+    continuation prefix) always stay, so words the corpus never contained
+    still tokenize into pieces instead of [UNK]. Of the rest, tokens seen at
+    least `min_count` times are kept, the most frequent first up to
+    `max_size` in total.
+    """
+    vocab = tokenizer.get_vocab()
+    always = set(tokenizer.all_special_ids)
+    always.update(i for token, i in vocab.items() if len(token) == 1 or (token.startswith("##") and len(token) == 3))
+    frequent = [i for i, count in counts.most_common() if count >= min_count and i not in always]
+    if max_size is not None:
+        frequent = frequent[:max(0, max_size - len(always))]
+    return sorted(always.union(frequent))
+
+
+def trim_model(model, tokenizer, keep: List[int], output_dir: str):
+    """Save `model` and `tokenizer` restricted to the token ids in `keep`, renumbered from 0."""
+    id_to_token = {i: token for token, i in tokenizer.get_vocab().items()}
+    os.makedirs(output_dir, exist_ok=True)
+    vocab_path = os.path.join(output_dir, "vocab.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        f.writelines(f"{id_to_token[i]}\n" for i in keep)
+    trimmed_tokenizer = DistilBertTokenizerFast(
+        vocab_file=vocab_path,
+        do_lower_case=getattr(tokenizer, "do_lower_case", True),
+        model_max_length=tokenizer.model_max_length,
+    )
+    trimmed_tokenizer.save_pretrained(output_dir)
+
+    embeddings = model.distilbert.embeddings.word_embeddings
+    trimmed = torch.nn.Embedding(len(keep), embeddings.embedding_dim, padding_idx=trimmed_tokenizer.pad_token_id)
+    with torch.no_grad():
+        trimmed.weight.copy_(embeddings.weight[torch.tensor(keep)])
+    model.distilbert.embeddings.word_embeddings = trimmed
+    model.config.vocab_size = len(keep)
+    model.config.pad_token_id = trimmed_tokenizer.pad_token_id
+    model.save_pretrained(output_dir)
+    return trimmed_tokenizer
+
+
+def parity(original, original_tokenizer, trimmed, trimmed_tokenizer, texts: List[str], batch_size: int = 64) -> Dict[str, float]:
+    """Tokenization agreement, label flips and logit gap between the original and trimmed models."""
+    same_tokens = flips = 0
+    max_delta = 0.0
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            a = original_tokenizer(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+            b = trimmed_tokenizer(batch, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+            old_tokens = [original_tokenizer.convert_ids_to_tokens(ids) for ids in a["input_ids"]]
+            new_tokens = [trimmed_tokenizer.convert_ids_to_tokens(ids) for ids in b["input_ids"]]
+            same_tokens += sum(old == new for old, new in zip(old_tokens, new_tokens))
+            logits_a = original(**a).logits
+            logits_b = trimmed(**b).logits
+            flips += int((logits_a.argmax(-1) != logits_b.argmax(-1)).sum())
+            max_delta = max(max_delta, float((logits_a - logits_b).abs().max()))
+    return {
+        "same_tokenization": same_tokens / len(texts),
+        "label_flip_rate": flips / len(texts),
+        "max_logit_delta": max_delta,
+    }
+
+
+def load_time(model_dir: str, runs: int = 5) -> float:
+    """Mean seconds to load tokenizer.json and create a session for the quantized graph."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        create_session(os.path.join(model_dir, QUANTIZED_MODEL))
+    return (time.perf_counter() - start) / runs
+
+
+def _bytes(model_dir: str, name: str) -> int:
+    return os.path.getsize(os.path.join(model_dir, name))
+
+
+def trim_vocab(
+    model_dir: str = MODEL_DIR,
+    trimmed_dir: str = TRIMMED_DIR,
+    trimmed_onnx_dir: str = TRIMMED_ONNX_DIR,
+    reference_onnx_dir: str = OUTPUT_DIR,
+    tweets_path: Optional[str] = None,
+    min_count: int = MIN_COUNT,
+    max_size: Optional[int] = None
+) -> Dict:
+    """
+    Shrink the classifier's vocabulary to the tokens the training corpus (and tweets) use.
+
+    Writes the trimmed model and a consistent tokenizer to `trimmed_dir`,
+    exports it for the extension, and reports file sizes and load times
+    against the untrimmed export (created in `reference_onnx_dir` if
+    missing) along with prediction parity on held-out texts: the test split
+    and, with `tweets_path`, a `TWEET_HOLDOUT` slice of the tweets. Neither
+    counts towards the kept vocabulary, so the parity check sees the
+    out-of-vocabulary words real inputs will bring.
+    """
+    if not os.path.isdir(model_dir):
+        raise FileNotFoundError(f"{model_dir} not found; run train.py first")
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+
+    splits = prepare_dataset(default_data_path())
+    texts = [text for text in splits["train"]["text"] if text]
+    held_out = [text for text in splits["test"]["text"] if text]
+    rng = np.random.default_rng(42)
+    if tweets_path:
+        tweets = read_texts(tweets_path)
+        tweets = [tweets[i] for i in rng.permutation(len(tweets))]
+        num_held_out = int(len(tweets) * TWEET_HOLDOUT)
+        held_out += tweets[:num_held_out]
+        tweets = tweets[num_held_out:]
+        logger.info(f"Counting tokens over {len(texts)} training texts and {len(tweets)} tweets")
+        texts = texts + tweets
+    keep = select_vocab(tokenizer, token_counts(tokenizer, texts), min_count, max_size)
+    logger.info(f"Keeping {len(keep)} of {len(tokenizer)} tokens")
+
+    trimmed = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    trimmed_tokenizer = trim_model(trimmed, tokenizer, keep, trimmed_dir)
+    sample = [held_out[i] for i in rng.permutation(len(held_out))[:PARITY_SAMPLE]]
+    checks = parity(model.eval(), tokenizer, trimmed.eval(), trimmed_tokenizer, sample)
+
+    if not os.path.exists(os.path.join(reference_onnx_dir, QUANTIZED_MODEL)):
+        export(model_dir, reference_onnx_dir)
+    export(trimmed_dir, trimmed_onnx_dir)
+
+    result = {"vocab_size": (len(tokenizer), len(keep)), **checks}
+    print(f"\n{'':>28} {'original':>10} {'trimmed':>10} {'saved':>7}")
+    print(f"{'vocab size':>28} {len(tokenizer):>10} {len(keep):>10} {1 - len(keep) / len(tokenizer):>7.0%}")
+    for name in ("vocab.txt", "tokenizer.json", QUANTIZED_MODEL):
+        before, after = _bytes(reference_onnx_dir, name), _bytes(trimmed_onnx_dir, name)
+        result[name] = (before, after)
+        print(f"{name + ' MB':>28} {before / 2**20:>10.2f} {after / 2**20:>10.2f} {1 - after / before:>7.0%}")
+    before, after = load_time(reference_onnx_dir), load_time(trimmed_onnx_dir)
+    result["load_seconds"] = (before, after)
+    print(f"{'load time ms':>28} {before * 1000:>10.1f} {after * 1000:>10.1f} {1 - after / before:>7.0%}")
+    print(
+        f"\nParity on {len(sample)} held-out texts: {checks['same_tokenization']:.2%} tokenized identically, "
+        f"{checks['label_flip_rate']:.2%} labels flipped, max |logit delta| {checks['max_logit_delta']:.2e}"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Trim the classifier's vocabulary to the tokens the data uses")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Output of train.py")
+    parser.add_argument("--trimmed-dir", default=TRIMMED_DIR)
+    parser.add_argument("--onnx-dir", default=TRIMMED_ONNX_DIR, help="Extension model folder for the trimmed model")
+    parser.add_argument("--reference-onnx-dir", default=OUTPUT_DIR, help="Untrimmed export (created if missing)")
+    parser.add_argument("--tweets", default=None, help="Tweet sample (.txt, one per line, or a file with a text column)")
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT, help="Occurrences needed to keep a token")
+    parser.add_argument("--max-size", type=int, default=None, help="Upper bound on the trimmed vocabulary")
+    args = parser.parse_args()
+    trim_vocab(
+        model_dir=args.model_dir,
+        trimmed_dir=args.trimmed_dir,
+        trimmed_onnx_dir=args.onnx_dir,
+        reference_onnx_dir=args.reference_onnx_dir,
+        tweets_path=args.tweets,
+        min_count=args.min_count,
+        max_size=args.max_size
+    )